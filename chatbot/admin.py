@@ -1,3 +1,39 @@
 from django.contrib import admin
+from .models import ArchivedChatMessage, ChatMessageLink, DocumentSummaryJob, LLMUsage
 
-# Register your models here.
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'route', 'model', 'period_start', 'calls', 'prompt_tokens', 'completion_tokens', 'cost_usd')
+    search_fields = ('user__email', 'route', 'model')
+    list_filter = ('route', 'model', 'period_start')
+    readonly_fields = ('created_at', 'updated_at')
+    ordering = ('-period_start',)
+
+
+
+@admin.register(ChatMessageLink)
+class ChatMessageLinkAdmin(admin.ModelAdmin):
+    list_display = ('message', 'archived_message', 'content_type', 'object_id', 'created_at')
+    search_fields = ('object_id', 'message__user__email', 'archived_message__user__email')
+    list_filter = ('content_type',)
+    raw_id_fields = ('message', 'archived_message')
+
+
+
+@admin.register(ArchivedChatMessage)
+class ArchivedChatMessageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'role', 'response_type', 'created_at', 'archived_at')
+    search_fields = ('user__email',)
+    list_filter = ('role', 'response_type')
+    readonly_fields = ('original_id', 'content', 'archived_at')
+    exclude = ('content_compressed',)
+
+
+
+@admin.register(DocumentSummaryJob)
+class DocumentSummaryJobAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'user', 'status', 'stage', 'chunks_done', 'created_at', 'completed_at')
+    search_fields = ('file_name', 'user__email')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'completed_at')
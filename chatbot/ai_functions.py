@@ -1,10 +1,16 @@
 import os
 import json
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timezone
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from django.conf import settings
+from . import metrics
+from .llm_router import run_routed, get_model_tiers, escalation_confidence
+from .llm_backends import get_chat_model
+from .llm_instrumentation import instrumented_call, invoke_llm, record_parse_failure, worker_call
+from .llm_cache import get_cached, set_cached, make_cache_key, normalize_text, history_fingerprint, date_bucket
 
 
 def _extract_json_objects(text: str) -> list:
@@ -97,16 +103,111 @@ def _process_multiple_items(items: list, raw_content: str) -> dict:
     }
 
 
+_REMINDERS_SCHEMA = {
+    "type": "array",
+    "description": "Reminders; time_before is in minutes",
+    "items": {
+        "type": "object",
+        "properties": {
+            "time_before": {"type": "integer"},
+            "types": {"type": "array", "items": {"type": "string", "enum": ["notification", "call"]}}
+        },
+        "required": ["time_before", "types"]
+    }
+}
+
+# Tool-calling schema for chatbot(): the provider validates arguments against it,
+# so replies are valid JSON by construction.
+CHATBOT_REPLY_SCHEMA = {
+    "title": "chat_reply",
+    "description": "Reply to the user and list every event, task or note to create.",
+    "type": "object",
+    "properties": {
+        "content": {
+            "type": "string",
+            "description": "Warm conversational reply shown to the user"
+        },
+        "items": {
+            "type": "array",
+            "description": "One entry per event, task or note to create. Empty for general responses.",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": ["event", "task", "note"]},
+                    "content": {"type": "string", "description": "Short confirmation for this item"},
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "location_address": {"type": "string", "description": "Events only, empty string if not mentioned"},
+                    "event_datetime": {"type": "string", "description": "Events only, YYYY-MM-DDTHH:MM:SSZ (UTC)"},
+                    "start_time": {"type": "string", "description": "Tasks only, YYYY-MM-DDTHH:MM:SSZ (UTC)"},
+                    "end_time": {"type": "string", "description": "Tasks only, deadline YYYY-MM-DDTHH:MM:SSZ (UTC)"},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                    "note_content": {"type": "string", "description": "Notes only, the information to save"},
+                    "reminders": _REMINDERS_SCHEMA
+                },
+                "required": ["type", "title"]
+            }
+        }
+    },
+    "required": ["content", "items"]
+}
+
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+    OUTPUT FORMAT:
+    Respond by calling the chat_reply function. Put your conversational reply in "content"
+    and add one entry to "items" for every event, task or note (leave "items" empty for
+    general responses). The JSON formats above describe the fields of each item; for notes
+    put the information to save in "note_content".
+    """
+
+
+def _process_structured_reply(reply: dict) -> Dict[str, Any]:
+    """Map a validated chat_reply tool call to the structured response format."""
+    content = (reply.get("content") or "").strip()
+    items = [item for item in reply.get("items") or [] if isinstance(item, dict)]
+
+    if not items:
+        return {"response_type": "response", "content": content}
+
+    if len(items) == 1:
+        result = _process_single_item(items[0], content)
+    else:
+        result = _process_multiple_items(items, content)
+
+    if content:
+        result["content"] = content
+    return result
+
+
+def _invoke_structured(llm: BaseChatModel, messages: list) -> Optional[Dict[str, Any]]:
+    """
+    Ask for the reply through the chat_reply tool. Returns None when the call or
+    the argument parsing fails so the caller can fall back to free-form JSON.
+    """
+    structured_llm = llm.with_structured_output(
+        CHATBOT_REPLY_SCHEMA,
+        method="function_calling",
+        include_raw=True
+    )
+    try:
+        output = instrumented_call("chatbot", llm.model_name, lambda: structured_llm.invoke(messages))
+    except Exception as e:
+        print(f"⚠️ Structured chatbot call failed, using legacy JSON mode: {e}")
+        return None
+
+    parsed = output.get("parsed")
+    if not isinstance(parsed, dict):
+        record_parse_failure("chatbot", llm.model_name)
+        print(f"⚠️ Structured chatbot reply could not be parsed: {output.get('parsing_error')}")
+        return None
+
+    return _process_structured_reply(parsed)
+
+
 def chatbot(convo_history: List[Dict], query: str) -> Dict[str, Any]:
 
     api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
     
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=0.7,
-        openai_api_key=api_key
-    )
-    
     current_date = datetime.now().strftime("%Y-%m-%d")
     current_time = datetime.now().strftime("%H:%M")
     
@@ -177,7 +278,7 @@ def chatbot(convo_history: List[Dict], query: str) -> Dict[str, Any]:
     - Your entire response must always be valid JSON (either a single object or an array)
     """
     
-    messages = [SystemMessage(content=system_prompt)]
+    messages = []
     
     # Add conversation history
     for msg in convo_history:
@@ -188,9 +289,35 @@ def chatbot(convo_history: List[Dict], query: str) -> Dict[str, Any]:
     
     # Add current query
     messages.append(HumanMessage(content=query))
+
+    result, _ = run_routed(
+        "chatbot",
+        lambda model, is_last: _chatbot_attempt(api_key, model, system_prompt, messages, allow_legacy=is_last),
+        accept=lambda outcome: outcome[1]
+    )
+    return result
+
+
+def _chatbot_attempt(api_key: str, model: str, system_prompt: str, messages: list,
+                     allow_legacy: bool) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    One chatbot() call on a single model tier. Returns (result, parsed_ok); the
+    legacy free-form JSON mode only runs on the last tier.
+    """
+    llm = get_chat_model("chatbot", model, temperature=0.7, api_key=api_key)
+
+    if getattr(settings, 'CHATBOT_STRUCTURED_OUTPUT', True):
+        structured_messages = [SystemMessage(content=system_prompt + STRUCTURED_OUTPUT_INSTRUCTIONS)] + messages
+        result = _invoke_structured(llm, structured_messages)
+        if result is not None:
+            metrics.incr("chatbot_output", "structured")
+            return result, True
+        metrics.incr("chatbot_output", "structured_fallback")
+        if not allow_legacy:
+            return None, False
     
-    # Get response
-    response = llm.invoke(messages)
+    # Get response (legacy free-form JSON mode)
+    response = invoke_llm("chatbot", llm, [SystemMessage(content=system_prompt)] + messages)
     
     # Parse JSON response
     try:
@@ -199,34 +326,36 @@ def chatbot(convo_history: List[Dict], query: str) -> Dict[str, Any]:
     except json.JSONDecodeError:
         # The AI sometimes returns two separate JSON objects instead of an array.
         # Try to extract all JSON objects from the raw text with a fallback parser.
-        import re
+        metrics.incr("chatbot_output", "json_repair")
         extracted = _extract_json_objects(response.content)
         if len(extracted) == 1:
             result = extracted[0]
         elif len(extracted) > 1:
             result = extracted  # treat as list
         else:
+            record_parse_failure("chatbot", model)
             return {
                 "response_type": "response",
                 "content": response.content
-            }
+            }, False
 
     try:
         # Handle list (multiple items)
         if isinstance(result, list):
-            return _process_multiple_items(result, response.content)
+            return _process_multiple_items(result, response.content), True
 
         # Ensure result is a dict
         if not isinstance(result, dict):
             raise ValueError("Invalid response format")
 
-        return _process_single_item(result, response.content)
+        return _process_single_item(result, response.content), True
 
     except (ValueError, KeyError):
+        record_parse_failure("chatbot", model)
         return {
             "response_type": "response",
             "content": response.content
-        }
+        }, False
 
 
 
@@ -245,18 +374,62 @@ def classifier(convo_history: List[Dict], query: str) -> Dict[str, Any]:
         For notes: {response_type, title, content}
         For response: {response_type}
     """
+    cache_key = _classifier_cache_key(convo_history, query)
+    cached = get_cached("classifier", cache_key)
+    if cached is not None:
+        return cached
+
     api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
     
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=0.3,
-        openai_api_key=api_key
-    )
+    messages = [SystemMessage(content=_classifier_system_prompt())]
+    
+    for msg in convo_history:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["message"]))
+        elif msg["role"] == "assistant":
+            messages.append(AIMessage(content=msg["message"]))
     
+    messages.append(HumanMessage(content=query))
+
+    def attempt(model, is_last):
+        llm = get_chat_model("classifier", model, temperature=0.3, api_key=api_key)
+        response = invoke_llm("classifier", llm, messages)
+        classified, confidence = _parse_classification(response.content)
+        if classified is None:
+            record_parse_failure("classifier", model)
+        return classified, confidence
+
+    # Escalate to the next model tier on parse failure or low confidence
+    classified, _ = run_routed(
+        "classifier",
+        attempt,
+        accept=lambda outcome: outcome[0] is not None and outcome[1] >= escalation_confidence()
+    )
+    if classified is None:
+        return {
+            "response_type": "response"
+        }
+
+    # Only successfully parsed classifications are cached
+    set_cached("classifier", cache_key, classified)
+    return classified
+
+
+def _classifier_cache_key(convo_history: List[Dict], query: str) -> str:
+    return make_cache_key(
+        "classifier",
+        query=normalize_text(query, casefold=True),
+        history=history_fingerprint(convo_history),
+        model=get_model_tiers("classifier"),
+        date_bucket=date_bucket()
+    )
+
+
+def _classifier_system_prompt() -> str:
     current_date = datetime.now().strftime("%Y-%m-%d")
     current_time = datetime.now().strftime("%H:%M")
     
-    system_prompt = f"""You are a classification system that categorizes user queries and extracts structured data.
+    return f"""You are a classification system that categorizes user queries and extracts structured data.
 
 Current date: {current_date}
 Current time: {current_time}
@@ -305,66 +478,228 @@ IMPORTANT:
 - Convert times to UTC (assume user is in UTC+6/Asia/Dhaka timezone)
 - time_before in reminders is in minutes
 - Extract relevant tags for tasks
+- Always include "confidence": a number from 0 to 1 for how sure you are about the type
 - Do NOT include conversational content - only classification data"""
-    
-    messages = [SystemMessage(content=system_prompt)]
-    
-    for msg in convo_history:
-        if msg["role"] == "user":
-            messages.append(HumanMessage(content=msg["message"]))
-        elif msg["role"] == "assistant":
-            messages.append(AIMessage(content=msg["message"]))
-    
-    messages.append(HumanMessage(content=query))
-    
-    response = llm.invoke(messages)
-    
+
+
+def _parse_classification(content: str) -> Tuple[Optional[Dict[str, Any]], float]:
+    """Parse a classifier reply into (classification or None, confidence)."""
     try:
-        result = json.loads(response.content.strip())
+        result = json.loads(content.strip())
         
         if isinstance(result, list):
             result = result[0] if result else {}
         
         if not isinstance(result, dict):
             raise ValueError("Invalid response format")
-        
-        response_type = result.get("type", "response")
-        
-        if response_type == "event":
-            return {
-                "response_type": "event",
-                "title": result.get("title", ""),
-                "description": result.get("description", ""),
-                "location_address": result.get("location_address", ""),
-                "event_datetime": result.get("event_datetime", ""),
-                "reminders": result.get("reminders", [{"time_before": 30, "types": ["notification"]}])
-            }
-        
-        elif response_type == "task":
-            return {
-                "response_type": "task",
-                "title": result.get("title", ""),
-                "description": result.get("description", ""),
-                "start_time": result.get("start_time", ""),
-                "end_time": result.get("end_time", ""),
-                "tags": result.get("tags", []),
-                "reminders": result.get("reminders", [{"time_before": 60, "types": ["notification"]}])
-            }
-        
-        elif response_type == "note":
-            return {
-                "response_type": "note",
-                "title": result.get("title", ""),
-                "content": result.get("content", "")
-            }
-        
-        else:  # response
-            return {
-                "response_type": "response"
-            }
+
+        return _classification_from_dict(result)
             
     except (json.JSONDecodeError, ValueError, KeyError) as e:
         print(f"⚠️ Classifier parsing error: {e}")
-        return {
+        return None, 0.0
+
+
+def _classification_from_dict(result: dict) -> Tuple[Dict[str, Any], float]:
+    """Map one parsed classifier dict to (classification, confidence)."""
+    try:
+        confidence = float(result.get("confidence", 1.0))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    
+    response_type = result.get("type", "response")
+    
+    if response_type == "event":
+        classified = {
+            "response_type": "event",
+            "title": result.get("title", ""),
+            "description": result.get("description", ""),
+            "location_address": result.get("location_address", ""),
+            "event_datetime": result.get("event_datetime", ""),
+            "reminders": result.get("reminders", [{"time_before": 30, "types": ["notification"]}])
+        }
+    
+    elif response_type == "task":
+        classified = {
+            "response_type": "task",
+            "title": result.get("title", ""),
+            "description": result.get("description", ""),
+            "start_time": result.get("start_time", ""),
+            "end_time": result.get("end_time", ""),
+            "tags": result.get("tags", []),
+            "reminders": result.get("reminders", [{"time_before": 60, "types": ["notification"]}])
+        }
+    
+    elif response_type == "note":
+        classified = {
+            "response_type": "note",
+            "title": result.get("title", ""),
+            "content": result.get("content", "")
+        }
+    
+    else:  # response
+        classified = {
             "response_type": "response"
         }
+
+    return classified, confidence
+
+
+def _classifier_batch_prompt() -> str:
+    return _classifier_system_prompt() + """
+
+BATCH MODE:
+- The user message is a JSON array of inputs: [{"index": 0, "text": "..."}, ...]
+- Classify every input independently; they are unrelated to each other
+- Return ONLY a JSON array with one object per input, in the same order,
+  each with its "index" plus the fields described above for its type"""
+
+
+def _classify_group(api_key: str, group: List[Tuple[int, str]]) -> Dict[int, Tuple[Dict[str, Any], float]]:
+    """Classify one packed group of (index, text) in a single LLM call."""
+    messages = [
+        SystemMessage(content=_classifier_batch_prompt()),
+        HumanMessage(content=json.dumps(
+            [{"index": index, "text": text} for index, text in group], ensure_ascii=False
+        ))
+    ]
+    expected = {index for index, _ in group}
+
+    def attempt(model, is_last):
+        llm = get_chat_model("classifier_batch", model, temperature=0.3, api_key=api_key)
+        response = invoke_llm("classifier_batch", llm, messages)
+        parsed = _parse_classification_batch(response.content, expected)
+        if parsed is None:
+            record_parse_failure("classifier_batch", model)
+        return parsed or {}
+
+    # Escalate the whole group only when the reply is not a usable array
+    return run_routed(
+        "classifier_batch",
+        attempt,
+        accept=lambda outcome: len(outcome) * 2 >= len(expected)
+    )
+
+
+def _parse_classification_batch(content: str, expected: set) -> Optional[Dict[int, Tuple[Dict[str, Any], float]]]:
+    try:
+        results = json.loads(content.strip())
+    except json.JSONDecodeError:
+        results = _extract_json_objects(content)
+
+    if isinstance(results, dict):
+        results = results.get("results", [results])
+    if not isinstance(results, list) or not results:
+        print("⚠️ Classifier batch parsing error: no JSON array in reply")
+        return None
+
+    parsed = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        try:
+            index = int(result.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if index in expected and index not in parsed:
+            parsed[index] = _classification_from_dict(result)
+    return parsed
+
+
+def classify_batch_llm_calls(count: int) -> int:
+    """Most LLM calls classify_batch() makes for `count` uncached queries (packed calls plus fallbacks)."""
+    batch_size = max(1, getattr(settings, "CLASSIFIER_BATCH_SIZE", 20))
+    return -(-count // batch_size) + min(count, max(0, getattr(settings, "CLASSIFIER_BATCH_MAX_FALLBACKS", 5)))
+
+
+def classify_batch(queries: List[str]) -> List[Dict[str, Any]]:
+    """
+    Classify many independent queries with as few LLM calls as possible.
+
+    Cached queries are answered first; the rest are packed CLASSIFIER_BATCH_SIZE
+    per call and run CLASSIFIER_BATCH_CONCURRENCY groups at a time. Up to
+    CLASSIFIER_BATCH_MAX_FALLBACKS items missing from a batch reply or below the
+    escalation confidence are re-run with classifier() on the same bounded pool.
+    Beyond that, low-confidence items keep their batch answer and missing items
+    come back as {"response_type": "response", "failed": True}. Results are in
+    input order.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+    cache_keys = [_classifier_cache_key([], query) for query in queries]
+    pending = []
+
+    for index, query in enumerate(queries):
+        cached = get_cached("classifier", cache_keys[index])
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append((index, query))
+
+    metrics.incr("classifier_batch", "requests")
+    metrics.incr("classifier_batch", "items", len(queries))
+    metrics.incr("classifier_batch", "cache_hits", len(queries) - len(pending))
+    if not pending:
+        return results
+
+    batch_size = max(1, getattr(settings, "CLASSIFIER_BATCH_SIZE", 20))
+    groups = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+    classified: Dict[int, Tuple[Dict[str, Any], float]] = {}
+
+    workers = max(1, getattr(settings, "CLASSIFIER_BATCH_CONCURRENCY", 4))
+    metrics.incr("classifier_batch", "llm_batches", len(groups))
+    with ThreadPoolExecutor(max_workers=min(len(groups), workers)) as pool:
+        # worker_call() keeps the llm_usage_scope user inside the worker threads
+        futures = [
+            pool.submit(worker_call(_classify_group), api_key, group)
+            for group in groups
+        ]
+        for future in futures:
+            try:
+                classified.update(future.result())
+            except Exception as e:
+                print(f"⚠️ Classifier batch failed: {e}")
+
+    unresolved = []
+    for index, query in pending:
+        item, confidence = classified.get(index, (None, 0.0))
+        if item is not None and confidence >= escalation_confidence():
+            set_cached("classifier", cache_keys[index], item)
+            results[index] = item
+        else:
+            unresolved.append((index, query))
+
+    # Missing items first: a low-confidence item still has a usable answer
+    unresolved.sort(key=lambda pair: pair[0] in classified)
+    fallbacks = unresolved[:max(0, getattr(settings, "CLASSIFIER_BATCH_MAX_FALLBACKS", 5))]
+    if fallbacks:
+        metrics.incr("classifier_batch", "fallbacks", len(fallbacks))
+        with ThreadPoolExecutor(max_workers=min(len(fallbacks), workers)) as pool:
+            futures = {
+                index: pool.submit(worker_call(classifier), [], query)
+                for index, query in fallbacks
+            }
+            for index, future in futures.items():
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    print(f"⚠️ Classifier fallback failed for item {index}: {e}")
+
+    failed = 0
+    for index, _ in unresolved:
+        if results[index] is None:
+            if index in classified:
+                results[index] = classified[index][0]
+            else:
+                failed += 1
+                results[index] = {"response_type": "response", "failed": True}
+
+    if failed:
+        metrics.incr("classifier_batch", "failed", failed)
+    return results
+
+
+def get_classifier_batch_stats() -> Dict[str, Any]:
+    return metrics.get_counters(
+        "classifier_batch", ["requests", "items", "cache_hits", "llm_batches", "fallbacks", "failed"]
+    )
@@ -0,0 +1,88 @@
+"""
+Silence-aware splitting of long recordings with ffmpeg.
+
+A long recording is split at silences into segments of at most
+max_seconds, so each one stays far below Whisper's upload limit and the
+segments can be transcribed concurrently. Each segment is re-encoded as
+16 kHz mono MP3 (Whisper's native rate), which also drops any video track.
+
+ffmpeg is optional: callers check ffmpeg_available() and send the whole
+file in one request without it.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START_RE = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END_RE = re.compile(r"silence_end: (\d+(?:\.\d+)?)")
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def probe_silences(path: str, noise_db: int = -35, min_silence: float = 0.5,
+                   timeout: int = 600) -> Tuple[float, List[Tuple[float, float]]]:
+    """Duration in seconds and (start, end) of every silence, decoding the file once."""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-vn",
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"],
+        capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not read audio: {result.stderr.strip()[-300:]}")
+
+    match = _DURATION_RE.search(result.stderr)
+    if not match:
+        raise RuntimeError("ffmpeg did not report a duration")
+    hours, minutes, seconds = match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    starts = [max(0.0, float(value)) for value in _SILENCE_START_RE.findall(result.stderr)]
+    ends = [float(value) for value in _SILENCE_END_RE.findall(result.stderr)]
+    # A trailing silence that runs to the end of the file has no silence_end
+    ends += [duration] * (len(starts) - len(ends))
+    return duration, list(zip(starts, ends))
+
+
+def plan_segments(duration: float, silences: List[Tuple[float, float]], max_seconds: float,
+                  min_seconds: float = 0) -> List[Tuple[float, float]]:
+    """
+    Cut [0, duration) into segments of at most max_seconds, each ending at the
+    middle of the latest silence that allows it (and at least min_seconds long);
+    with no silence in range the segment is cut at max_seconds.
+    """
+    cuts = sorted((start + end) / 2 for start, end in silences)
+    segments = []
+    start = 0.0
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        low = bisect_left(cuts, start + min_seconds)
+        high = bisect_right(cuts, limit)
+        end = cuts[high - 1] if high > low else limit
+        segments.append((start, end))
+        start = end
+    segments.append((start, duration))
+    return segments
+
+
+def export_segment(path: str, start: float, end: float, bitrate: str = "48k", timeout: int = 600) -> str:
+    """Write [start, end) of the recording to a temporary MP3; the caller deletes it."""
+    fd, out_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    try:
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+             "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", path,
+             "-vn", "-ac", "1", "-ar", "16000", "-b:a", bitrate, out_path],
+            check=True, capture_output=True, timeout=timeout
+        )
+    except Exception:
+        os.unlink(out_path)
+        raise
+    return out_path
@@ -0,0 +1,248 @@
+"""
+Write-behind persistence for chat turns.
+
+A turn (user message, assistant message and the items it created) is built in
+memory while the request runs and written afterwards in one batch: one
+bulk_create for both messages and one for their ChatMessageLink rows.
+
+With CHAT_WRITE_BEHIND_ASYNC the write is handed to a Celery task instead.
+Until the worker commits it, the turn is kept in the cache as a pending turn:
+the history endpoint and the next chat turn's LLM context read pending turns
+as well, so users always see their own writes.
+"""
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from . import metrics
+
+
+PENDING_WINDOW = 50
+
+
+def _pending_seq_key(user_id) -> str:
+    return f"chatbot:pending_turns:{user_id}:seq"
+
+
+def _pending_slot_key(user_id, seq: int) -> str:
+    return f"chatbot:pending_turns:{user_id}:{seq}"
+
+
+def _context_key(user_id) -> str:
+    return f"chatbot:context:{user_id}"
+
+
+def build_turn(user, user_content: str, user_created_at: datetime,
+               assistant: Optional[Dict[str, Any]] = None,
+               item_links: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    JSON-serializable description of one chat turn.
+
+    assistant holds the ChatMessage fields (content, response_type, metadata);
+    item_links is [{'type': 'event'|'task'|'note', 'id': <uuid>}].
+    """
+    turn_id = uuid.uuid4().hex
+    if assistant is not None:
+        assistant = {**assistant, 'created_at': timezone.now().isoformat()}
+        assistant['metadata'] = {**(assistant.get('metadata') or {}), 'turn_id': turn_id}
+
+    return {
+        'turn_id': turn_id,
+        'user_id': user.pk,
+        'user': {'content': user_content, 'created_at': user_created_at.isoformat()},
+        'assistant': assistant,
+        'links': item_links or [],
+    }
+
+
+def save_turn(turn: Dict[str, Any]):
+    """Insert the turn's messages and links in one transaction; returns the assistant ChatMessage."""
+    from django.contrib.contenttypes.models import ContentType
+    from actions.models import Event, Note, Task
+    from .models import ChatMessage, ChatMessageLink
+
+    messages = [ChatMessage(
+        user_id=turn['user_id'],
+        role='user',
+        content=turn['user']['content'],
+        created_at=datetime.fromisoformat(turn['user']['created_at'])
+    )]
+    assistant = turn.get('assistant')
+    if assistant:
+        messages.append(ChatMessage(
+            user_id=turn['user_id'],
+            role='assistant',
+            content=assistant['content'],
+            response_type=assistant.get('response_type'),
+            metadata=assistant.get('metadata'),
+            created_at=datetime.fromisoformat(assistant['created_at'])
+        ))
+
+    models_by_type = {'event': Event, 'task': Task, 'note': Note}
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages)
+        if assistant and turn.get('links'):
+            ChatMessageLink.objects.bulk_create([
+                ChatMessageLink(
+                    message=messages[-1],
+                    content_type=ContentType.objects.get_for_model(models_by_type[link['type']]),
+                    object_id=link['id']
+                )
+                for link in turn['links'] if link.get('type') in models_by_type
+            ], ignore_conflicts=True)
+
+    if turn.get('pending_seq'):
+        try:
+            cache.delete(_pending_slot_key(turn['user_id'], turn['pending_seq']))
+        except Exception as e:
+            # History dedupes by turn_id, so a leftover slot only lingers until its TTL
+            print(f"⚠️ Failed to clear pending chat turn {turn['turn_id']}: {e}")
+    return messages[-1] if assistant else None
+
+
+def submit_turn(turn: Dict[str, Any]):
+    """
+    Persist a turn now, or queue it when CHAT_WRITE_BEHIND_ASYNC is on.
+
+    Returns the saved assistant ChatMessage, or None when the write was deferred.
+    """
+    remember_turn(turn)
+
+    if getattr(settings, 'CHAT_WRITE_BEHIND_ASYNC', False):
+        from .tasks import persist_chat_turn
+        try:
+            turn['pending_seq'] = _add_pending(turn)
+            persist_chat_turn.delay(turn)
+            metrics.incr('chat_turns', 'deferred')
+            return None
+        except Exception as e:
+            print(f"⚠️ Could not queue chat turn {turn['turn_id']}, writing it now: {e}")
+
+    metrics.incr('chat_turns', 'sync')
+    return save_turn(turn)
+
+
+def _add_pending(turn: Dict[str, Any]) -> int:
+    ttl = getattr(settings, 'CHAT_PENDING_TURN_TTL', 600)
+    seq_key = _pending_seq_key(turn['user_id'])
+    cache.add(seq_key, 0, None)
+    seq = cache.incr(seq_key)
+    cache.set(_pending_slot_key(turn['user_id'], seq), turn, ttl)
+    return seq
+
+
+def get_pending_turns(user_id) -> List[Dict[str, Any]]:
+    """Turns queued for this user that the worker has not committed yet, oldest first."""
+    if not getattr(settings, 'CHAT_WRITE_BEHIND_ASYNC', False):
+        return []
+    try:
+        seq = cache.get(_pending_seq_key(user_id)) or 0
+        keys = [_pending_slot_key(user_id, n) for n in range(max(1, seq - PENDING_WINDOW + 1), seq + 1)]
+        found = cache.get_many(keys) if keys else {}
+    except Exception as e:
+        print(f"⚠️ Failed to read pending chat turns: {e}")
+        return []
+    return [found[key] for key in keys if key in found]
+
+
+def pending_history_messages(user_id, exclude_turn_ids=()) -> List[Dict[str, Any]]:
+    """Pending turns as ChatMessageSerializer-shaped dicts for the history endpoint."""
+    messages = []
+    for turn in get_pending_turns(user_id):
+        if turn['turn_id'] in exclude_turn_ids:
+            continue
+        messages.append({
+            'role': 'user',
+            'content': turn['user']['content'],
+            'created_at': turn['user']['created_at'],
+            'response_type': 'response',
+            'metadata': None,
+        })
+        if turn.get('assistant'):
+            assistant = turn['assistant']
+            messages.append({
+                'role': 'assistant',
+                'content': assistant['content'],
+                'created_at': assistant['created_at'],
+                'response_type': assistant.get('response_type'),
+                'metadata': assistant.get('metadata'),
+            })
+    return messages
+
+
+def get_recent_history(user) -> List[Dict[str, str]]:
+    """
+    The last CHAT_CONTEXT_MESSAGES messages as chatbot() history entries.
+
+    Served from a per-user cache kept current by remember_turn(), so a chat
+    turn usually needs no history SELECT.
+    """
+    from .models import ChatMessage
+
+    try:
+        cached = cache.get(_context_key(user.pk))
+    except Exception:
+        cached = None
+    if cached is not None:
+        metrics.incr('chat_turns', 'context_hits')
+        return cached
+
+    metrics.incr('chat_turns', 'context_misses')
+    limit = getattr(settings, 'CHAT_CONTEXT_MESSAGES', 20)
+    history = [
+        {
+            'role': msg.role,
+            'timestamp': msg.created_at.isoformat(),
+            'message': msg.content
+        }
+        for msg in reversed(ChatMessage.objects.filter(user=user).order_by('-created_at', '-id')[:limit])
+    ]
+    for turn in get_pending_turns(user.pk):
+        history.extend(_history_entries(turn))
+    history = history[-limit:]
+    _set_context(user.pk, history)
+    return history
+
+
+def remember_turn(turn: Dict[str, Any]) -> None:
+    """
+    Append a turn to the cached LLM context.
+
+    Best effort: if two turns of the same user race, one may be missing from
+    the cached context until it expires; the database stays complete.
+    """
+    try:
+        history = cache.get(_context_key(turn['user_id']))
+        if history is None:
+            return
+        limit = getattr(settings, 'CHAT_CONTEXT_MESSAGES', 20)
+        _set_context(turn['user_id'], (history + _history_entries(turn))[-limit:])
+    except Exception as e:
+        print(f"⚠️ Failed to update chat context cache: {e}")
+
+
+def _history_entries(turn: Dict[str, Any]) -> List[Dict[str, str]]:
+    entries = [{'role': 'user', 'timestamp': turn['user']['created_at'], 'message': turn['user']['content']}]
+    if turn.get('assistant'):
+        entries.append({
+            'role': 'assistant',
+            'timestamp': turn['assistant']['created_at'],
+            'message': turn['assistant']['content']
+        })
+    return entries
+
+
+def _set_context(user_id, history: List[Dict[str, str]]) -> None:
+    try:
+        cache.set(_context_key(user_id), history, getattr(settings, 'CHAT_CONTEXT_CACHE_TTL', 600))
+    except Exception as e:
+        print(f"⚠️ Failed to cache chat context: {e}")
+
+
+def get_chat_turn_stats() -> Dict[str, Any]:
+    counters = metrics.get_counters('chat_turns', ['sync', 'deferred', 'context_hits', 'context_misses'])
+    counters['context_hit_rate'] = metrics.hit_rate(counters['context_hits'], counters['context_misses'])
+    return counters
@@ -0,0 +1,130 @@
+"""
+Content-addressed cache for uploaded documents.
+
+Files are identified by the SHA-256 of their bytes. Two layers are cached
+separately so a re-upload, or the same file with a new max_length or custom
+prompt, only re-runs the final combine call:
+
+- extracted text (or audio transcript) per file digest, zlib-compressed and
+  written/read as a stream so it never has to be joined into one string;
+- section and combine summaries per SHA-256 of their input text, in the LLM
+  response cache (namespace "summarize_chunk").
+"""
+import codecs
+import hashlib
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+from .llm_cache import get_cached, make_cache_key, set_cached
+
+
+DOCUMENT_CACHE_KEY_PREFIX = "chatbot:doc_text"
+# Bump when extraction output changes so stale text is not reused
+EXTRACTOR_VERSION = 2
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def stream_sha256(f: BinaryIO, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a binary file object from its start; leaves it rewound."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for block in iter(lambda: f.read(block_size), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _text_key(file_digest: str, kind: str) -> str:
+    return f"{DOCUMENT_CACHE_KEY_PREFIX}:{kind}:v{EXTRACTOR_VERSION}:{file_digest}"
+
+
+def _enabled() -> bool:
+    return getattr(settings, "DOCUMENT_CACHE_ENABLED", True)
+
+
+def get_cached_text(file_digest: str, kind: str = "text") -> Optional[Iterator[str]]:
+    """Stream of the cached extracted text for a file, or None on a miss."""
+    if not _enabled():
+        return None
+    try:
+        blob = cache.get(_text_key(file_digest, kind))
+    except Exception as e:
+        print(f"⚠️ Document cache read failed: {e}")
+        blob = None
+
+    metrics.incr("document_cache", f"{kind}_hits" if blob is not None else f"{kind}_misses")
+    return _iter_decompressed(blob) if blob is not None else None
+
+
+def _iter_decompressed(blob: bytes) -> Iterator[str]:
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for start in range(0, len(blob), STREAM_BLOCK_SIZE):
+        text = decoder.decode(decompressor.decompress(blob[start:start + STREAM_BLOCK_SIZE]))
+        if text:
+            yield text
+    text = decoder.decode(decompressor.flush(), final=True)
+    if text:
+        yield text
+
+
+def cache_text_stream(file_digest: str, pieces: Iterable[str], kind: str = "text") -> Iterator[str]:
+    """
+    Pass pieces through unchanged while compressing them; once the stream is
+    fully consumed the compressed text is stored, unless it grew past
+    DOCUMENT_CACHE_MAX_BYTES.
+    """
+    if not _enabled():
+        yield from pieces
+        return
+
+    max_bytes = getattr(settings, "DOCUMENT_CACHE_MAX_BYTES", 8 * 1024 * 1024)
+    compressor = zlib.compressobj(6)
+    parts = []
+    size = 0
+    for piece in pieces:
+        if parts is not None:
+            data = compressor.compress(piece.encode("utf-8"))
+            size += len(data)
+            if size > max_bytes:
+                parts = None
+            elif data:
+                parts.append(data)
+        yield piece
+
+    if parts is None:
+        return
+    parts.append(compressor.flush())
+    try:
+        cache.set(_text_key(file_digest, kind), b"".join(parts), getattr(settings, "DOCUMENT_CACHE_TTL", 60 * 60 * 24 * 7))
+        metrics.incr("document_cache", f"{kind}_stores")
+    except Exception as e:
+        print(f"⚠️ Document cache write failed: {e}")
+
+
+def summary_cache_key(kind: str, text: str, model: str) -> str:
+    """Key for a section ("section") or group ("combine") summary of exactly this text."""
+    return make_cache_key("summarize_chunk", kind=kind, text_sha256=text_sha256(text), model=model)
+
+
+def get_cached_summary(kind: str, text: str, model: str) -> Optional[str]:
+    return get_cached("summarize_chunk", summary_cache_key(kind, text, model))
+
+
+def set_cached_summary(kind: str, text: str, model: str, summary: str) -> None:
+    if summary:
+        set_cached("summarize_chunk", summary_cache_key(kind, text, model), summary)
+
+
+def get_document_cache_stats():
+    names = [f"{kind}_{outcome}" for kind in ("text", "transcript") for outcome in ("hits", "misses", "stores")]
+    counters = metrics.get_counters("document_cache", names)
+    for kind in ("text", "transcript"):
+        counters[f"{kind}_hit_rate"] = metrics.hit_rate(counters[f"{kind}_hits"], counters[f"{kind}_misses"])
+    return counters
@@ -1,14 +1,38 @@
 import os
+import base64
+import codecs
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, Optional
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 from openai import OpenAI
 from django.conf import settings
+from .llm_router import run_routed, get_model_tiers
+from .llm_backends import get_openai_client
+from .llm_instrumentation import instrumented_call, worker_call
+from .llm_cache import get_cached, set_cached, make_cache_key, normalize_text
+from .text_chunker import count_tokens, iter_token_chunks
+from .pdf_text import iter_pdf_pages
+from .image_preprocess import prepare_image
+from .audio_segments import export_segment, ffmpeg_available, plan_segments, probe_silences
+from .document_cache import (
+    cache_text_stream, get_cached_summary, get_cached_text, set_cached_summary, stream_sha256
+)
+
+T = TypeVar("T")
+# progress(stage, chunks_done); chunks_done is None for stages that do not count chunks
+ProgressCallback = Callable[[str, Optional[int]], None]
+# A file on disk, or an open binary file (e.g. a small upload Django kept in memory)
+DocumentSource = Union[Path, BinaryIO]
 
 # Audio/video file extensions that need Whisper API
 AUDIO_EXTENSIONS = {'.mp3', '.mp4', '.mpeg', '.mpga', '.m4a', '.wav', '.webm'}
 
 
-def summarize_document(file_path: str, max_length: int = 500, custom_prompt: Optional[str] = None) -> Dict[str, str]:
+def summarize_document(file_path: str, max_length: int = 500, custom_prompt: Optional[str] = None,
+                       progress: Optional[ProgressCallback] = None) -> Dict[str, str]:
     """
     Summarize any document by uploading to OpenAI.
     
@@ -16,6 +40,8 @@ def summarize_document(file_path: str, max_length: int = 500, custom_prompt: Opt
         file_path: Path to file (PDF, DOCX, TXT, audio, video, image)
         max_length: Target summary length in words (default: 500)
         custom_prompt: Optional custom instructions for summarization
+        progress: Optional callback(stage, chunks_done) called from the calling
+            thread as the pipeline advances (used by background jobs)
         
     Returns:
         {'summary': str, 'file_name': str, 'file_size': str}
@@ -24,26 +50,28 @@ def summarize_document(file_path: str, max_length: int = 500, custom_prompt: Opt
         result = summarize_document("report.pdf") 
         print(result['summary'])
     """
-    api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
-    client = OpenAI(api_key=api_key)
     path = Path(file_path)
     
     if not path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
     
-    file_size = path.stat().st_size / 1024  # KB
-    
-    # Route to appropriate API based on file type
-    if path.suffix.lower() in AUDIO_EXTENSIONS:
-        summary = _process_audio(client, path, max_length, custom_prompt)
+    return _summarize_source(path, path.name, path.stat().st_size, max_length, custom_prompt, progress)
+
+
+def summarize_upload(uploaded_file, max_length: int = 500, custom_prompt: Optional[str] = None,
+                     progress: Optional[ProgressCallback] = None) -> Dict[str, str]:
+    """
+    Summarize a Django UploadedFile without copying it.
+
+    Large uploads are read from the temporary file Django already streamed
+    them to; small ones (under FILE_UPLOAD_MAX_MEMORY_SIZE) straight from memory.
+    Returns the same dict as summarize_document().
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        source = Path(uploaded_file.temporary_file_path())
     else:
-        summary = _process_document(client, path, max_length, custom_prompt)
-    
-    return {
-        "summary": summary,
-        "file_name": path.name,
-        "file_size": f"{file_size:.2f} KB"
-    }
+        source = uploaded_file.file
+    return _summarize_source(source, uploaded_file.name, uploaded_file.size or 0, max_length, custom_prompt, progress)
 
 
 def summarize_text(text: str, max_length: int = 500, custom_prompt: Optional[str] = None) -> Dict[str, str]:
@@ -58,69 +86,161 @@ def summarize_text(text: str, max_length: int = 500, custom_prompt: Optional[str
     Returns:
         {'summary': str, 'original_length': int, 'summary_length': int}
     """
+    cache_key = make_cache_key(
+        "summarize_text",
+        text=normalize_text(text),
+        model=get_model_tiers("summarize_text"),
+        max_length=str(max_length),
+        custom_prompt=normalize_text(custom_prompt)
+    )
+    cached = get_cached("summarize_text", cache_key)
+    if cached is not None:
+        return cached
+
     api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     prompt = custom_prompt or f"Summarize this in {max_length} words:\n\n{text}"
     
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a concise summarizer."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.5
-    )
-    
-    summary = response.choices[0].message.content.strip()
+    def attempt(model, is_last):
+        response = instrumented_call("summarize_text", model, lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a concise summarizer."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.5
+        ))
+        return (response.choices[0].message.content or "").strip()
+
+    # Escalate to the next model tier on an empty summary
+    summary = run_routed("summarize_text", attempt, accept=bool)
     
-    return {
+    result = {
         "summary": summary,
         "original_length": len(text.split()),
         "summary_length": len(summary.split())
     }
+    if summary:
+        set_cached("summarize_text", cache_key, result)
+    return result
 
 
-# ============================================================================
-# Internal Processing Functions
-# ============================================================================
+def summarize_combined(named_summaries: List[Tuple[str, str]], max_length: int = 500,
+                       custom_prompt: Optional[str] = None) -> str:
+    """
+    One cross-document summary from per-file summaries.
 
-def _process_audio(client: OpenAI, path: Path, max_length: int, custom_prompt: Optional[str]) -> str:
-    """Process audio/video files using Whisper API."""
-    with open(path, "rb") as audio_file:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file
+    Args:
+        named_summaries: (file_name, summary) pairs in the order to present them
+        max_length: Target summary length in words
+        custom_prompt: Optional custom instructions
+    """
+    api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+    client = get_openai_client(api_key)
+
+    sections = [f"{file_name}:\n{summary}" for file_name, summary in named_summaries]
+    combined = _reduce_summaries(client, sections, getattr(settings, 'DOCUMENT_CHUNK_TOKENS', 6000))
+    if custom_prompt:
+        prompt = f"{custom_prompt}\n\nDocument summaries:\n\n{combined}"
+    else:
+        prompt = (
+            f"Combine these summaries of {len(named_summaries)} documents into one cohesive summary "
+            f"of {max_length} words, noting where the documents agree or differ:\n\n{combined}"
         )
-    
-    prompt = custom_prompt or f"Summarize this transcript in {max_length} words:\n\n{transcript.text}"
-    
-    response = client.chat.completions.create(
+
+    response = instrumented_call("summarize_document", "gpt-4", lambda: client.chat.completions.create(
         model="gpt-4",
         messages=[
             {"role": "system", "content": "You are a concise summarizer."},
             {"role": "user", "content": prompt}
         ],
         temperature=0.5
-    )
-    
+    ))
     return response.choices[0].message.content.strip()
 
 
-def _process_document(client: OpenAI, path: Path, max_length: int, custom_prompt: Optional[str]) -> str:
+# ============================================================================
+# Internal Processing Functions
+# ============================================================================
+
+def _summarize_source(source: DocumentSource, file_name: str, size_bytes: int, max_length: int,
+                      custom_prompt: Optional[str], progress: Optional[ProgressCallback]) -> Dict[str, str]:
+    api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
+    client = get_openai_client(api_key)
+    file_ext = os.path.splitext(file_name)[1].lower()
+
+    # Route to appropriate API based on file type
+    if file_ext in AUDIO_EXTENSIONS:
+        summary = _process_audio(client, source, file_name, max_length, custom_prompt, progress)
+    else:
+        summary = _process_document(client, source, file_ext, max_length, custom_prompt, progress)
+
+    return {
+        "summary": summary,
+        "file_name": file_name,
+        "file_size": f"{size_bytes / 1024:.2f} KB"
+    }
+
+
+@contextmanager
+def _open_binary(source: DocumentSource) -> Iterator[BinaryIO]:
+    """Binary file positioned at the start; files opened here are closed afterwards."""
+    if isinstance(source, Path):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        source.seek(0)
+        yield source
+
+
+def _report(progress: Optional[ProgressCallback], stage: str, chunks_done: Optional[int] = None) -> None:
+    if progress is None:
+        return
+    try:
+        progress(stage, chunks_done)
+    except Exception as e:
+        # Progress reporting must never fail the summary
+        print(f"⚠️ Failed to report document progress ({stage}): {e}")
+
+
+def _process_audio(client: OpenAI, source: DocumentSource, file_name: str, max_length: int,
+                   custom_prompt: Optional[str], progress: Optional[ProgressCallback] = None) -> str:
+    """Process audio/video files using Whisper API."""
+    # Transcripts are cached by file content, so a re-upload skips Whisper
+    with _open_binary(source) as f:
+        file_digest = stream_sha256(f)
+    pieces = get_cached_text(file_digest, kind="transcript")
+    if pieces is None:
+        _report(progress, "transcribing")
+        pieces = cache_text_stream(file_digest, _iter_transcript(client, source, file_name), kind="transcript")
+
+    # Segment transcripts are chunked and summarized as they arrive
+    summary = _summarize_pieces(
+        client, pieces, max_length, custom_prompt, progress,
+        route="summarize_audio", instruction="Summarize this transcript"
+    )
+    if summary is None:
+        return "No speech was found in the audio file."
+    return summary
+
+
+def _process_document(client: OpenAI, source: DocumentSource, file_ext: str, max_length: int,
+                      custom_prompt: Optional[str], progress: Optional[ProgressCallback] = None) -> str:
     """Process documents using Vision API for images or direct text extraction for docs."""
     
-    file_ext = path.suffix.lower()
-    
     # For images, use Vision API
     if file_ext in {'.png', '.jpg', '.jpeg', '.gif', '.webp'}:
-        import base64
-        with open(path, "rb") as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+        with _open_binary(source) as image_file:
+            prepared = prepare_image(image_file)
+            if prepared is not None:
+                image_url = f"data:{prepared.mime_type};base64,{base64.b64encode(prepared.data).decode('ascii')}"
+            else:
+                image_url = f"data:image/{file_ext[1:]};base64,{''.join(_iter_base64(image_file))}"
         
         prompt = custom_prompt or f"Describe and summarize this image in {max_length} words."
         
-        response = client.chat.completions.create(
+        response = instrumented_call("summarize_image", "gpt-4o", lambda: client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
@@ -129,88 +249,67 @@ def _process_document(client: OpenAI, path: Path, max_length: int, custom_prompt
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/{file_ext[1:]};base64,{image_data}"}
+                            "image_url": {"url": image_url}
                         }
                     ]
                 }
             ]
-        )
+        ))
         return response.choices[0].message.content.strip()
     
-    # For PDF and DOCX - extract text first then summarize
-    if file_ext == '.pdf':
-        try:
-            import PyPDF2
-            text = ""
-            with open(path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-        except ImportError:
-            return "Error: PyPDF2 not installed. Run: pip install PyPDF2"
-    
-    elif file_ext == '.docx':
-        try:
-            from docx import Document
-            doc = Document(path)
-            
-            # Extract text from paragraphs
-            paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
-            
-            # Also extract text from tables
-            tables_text = []
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            tables_text.append(cell.text.strip())
-            
-            # Combine all text
-            all_text = paragraphs + tables_text
-            text = "\n".join(all_text)
-            
-            # Debug: Print what was extracted
-            print(f"📄 DOCX extraction - Paragraphs: {len(paragraphs)}, Table cells: {len(tables_text)}, Total chars: {len(text)}")
-            
-            # If no text extracted, return helpful error
-            if not text.strip():
-                return "The DOCX file appears to be empty or contains only images. No text content was found to summarize."
-                
-        except ImportError:
-            return "Error: python-docx not installed. Run: pip install python-docx"
-        except Exception as e:
+    _report(progress, "extracting")
+    # For PDF, DOCX and text files - stream extracted text into chunks, then summarize.
+    # Extracted text is cached by file content; a miss tees the extractor into the cache
+    with _open_binary(source) as f:
+        file_digest = stream_sha256(f)
+    try:
+        pieces = get_cached_text(file_digest)
+        if pieces is None:
+            pieces = cache_text_stream(file_digest, _extract_text_pieces(source, file_ext))
+    except ImportError:
+        package = {'.pdf': 'PyPDF2', '.docx': 'python-docx'}.get(file_ext, 'the required package')
+        return f"Error: {package} not installed. Run: pip install {package}"
+    except Exception as e:
+        if file_ext == '.docx':
             return f"Error reading DOCX file: {str(e)}"
-    
-    else:
-        # Plain text files
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read()
+        raise
+
+    summary = _summarize_pieces(client, pieces, max_length, custom_prompt, progress)
     
     # Validate that we have some text
-    if not text or not text.strip():
+    if summary is None:
+        if file_ext == '.docx':
+            return "The DOCX file appears to be empty or contains only images. No text content was found to summarize."
         return f"No text content found in the {file_ext} file. The file may be empty or contain only non-text elements."
+    return summary
+
+
+def _summarize_pieces(client: OpenAI, pieces: Iterable[str], max_length: int, custom_prompt: Optional[str],
+                      progress: Optional[ProgressCallback] = None, route: str = "summarize_document",
+                      instruction: str = "Summarize this") -> Optional[str]:
+    """
+    Chunk streamed text and summarize it: one call for a single chunk,
+    otherwise map/reduce over the chunks and a final combine call.
+    Returns None when the text is blank.
+    """
+    # Chunks are packed up to max_tokens on sentence/paragraph boundaries;
+    # combined summaries must also fit in max_tokens for the final prompt
+    max_tokens = getattr(settings, 'DOCUMENT_CHUNK_TOKENS', 6000)
+    chunks = iter_token_chunks(
+        pieces, max_tokens, getattr(settings, 'DOCUMENT_CHUNK_OVERLAP_TOKENS', 200), model="gpt-4"
+    )
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        return None
     
-    # Summarize extracted text
-    # If text is too long, chunk it
-    max_chars = 20000  # Safe limit for GPT-4
-    if len(text) > max_chars:
-        # Split into chunks and summarize each
-        chunks = [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-        summaries = []
-        
-        for i, chunk in enumerate(chunks):
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a concise summarizer."},
-                    {"role": "user", "content": f"Summarize this section:\n\n{chunk}"}
-                ],
-                temperature=0.5
-            )
-            summaries.append(response.choices[0].message.content.strip())
+    second_chunk = next(chunks, None)
+    if second_chunk is not None:
+        # Map: summarize chunks concurrently as the extractor produces them
+        summaries = _summarize_chunks(client, itertools.chain([first_chunk, second_chunk], chunks), progress)
         
-        # Combine summaries
-        combined = "\n\n".join(summaries)
+        # Reduce: combine summaries in groups until they fit in one prompt
+        _report(progress, "reducing")
+        combined = _reduce_summaries(client, summaries, max_tokens)
         # If custom prompt provided, use it as additional instruction
         if custom_prompt:
             final_prompt = f"{custom_prompt}\n\nText to summarize:\n\n{combined}"
@@ -219,18 +318,298 @@ def _process_document(client: OpenAI, path: Path, max_length: int, custom_prompt
     else:
         # If custom prompt provided, use it as instruction but ALWAYS include the text
         if custom_prompt:
-            final_prompt = f"{custom_prompt}\n\nText to summarize:\n\n{text}"
+            final_prompt = f"{custom_prompt}\n\nText to summarize:\n\n{first_chunk}"
         else:
-            final_prompt = f"Summarize this in {max_length} words:\n\n{text}"
+            final_prompt = f"{instruction} in {max_length} words:\n\n{first_chunk}"
     
-    response = client.chat.completions.create(
+    _report(progress, "combining")
+    response = instrumented_call(route, "gpt-4", lambda: client.chat.completions.create(
         model="gpt-4",
         messages=[
             {"role": "system", "content": "You are a concise summarizer."},
             {"role": "user", "content": final_prompt}
         ],
         temperature=0.5
-    )
+    ))
     
     return response.choices[0].message.content.strip()
 
+
+# ============================================================================
+# Streaming text extraction
+# ============================================================================
+
+def _extract_text_pieces(source: DocumentSource, file_ext: str) -> Iterator[str]:
+    """
+    Open a document and return a generator of its text in reading order
+    (pages, paragraphs or blocks), so callers never hold the whole text.
+
+    Imports and opening happen eagerly so missing packages and unreadable
+    files fail here rather than mid-iteration.
+    """
+    if file_ext == '.pdf':
+        import PyPDF2
+        return _iter_pdf_text(source, PyPDF2)
+    if file_ext == '.docx':
+        from docx import Document
+        if not isinstance(source, Path):
+            source.seek(0)
+        return _iter_docx_text(Document(source))
+    return _iter_text_file(source)
+
+
+def _iter_pdf_text(source: DocumentSource, PyPDF2) -> Iterator[str]:
+    if isinstance(source, Path) and source.stat().st_size:
+        # Memory-mapped, and long PDFs are extracted in page ranges across processes
+        yield from iter_pdf_pages(
+            str(source),
+            workers=getattr(settings, 'DOCUMENT_PDF_WORKERS', 4),
+            pages_per_task=getattr(settings, 'DOCUMENT_PDF_PAGES_PER_TASK', 8),
+            min_parallel_pages=getattr(settings, 'DOCUMENT_PDF_PARALLEL_MIN_PAGES', 16)
+        )
+        return
+
+    # Small uploads held in memory
+    with _open_binary(source) as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            yield (page.extract_text() or "") + "\n"
+
+
+def _iter_docx_text(doc) -> Iterator[str]:
+    paragraphs = 0
+    table_cells = 0
+
+    # Text from paragraphs
+    for para in doc.paragraphs:
+        if para.text.strip():
+            paragraphs += 1
+            yield para.text + "\n"
+
+    # Also text from tables
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                if cell.text.strip():
+                    table_cells += 1
+                    yield cell.text.strip() + "\n"
+
+    print(f"📄 DOCX extraction - Paragraphs: {paragraphs}, Table cells: {table_cells}")
+
+
+def _iter_text_file(source: DocumentSource, block_size: int = 64 * 1024) -> Iterator[str]:
+    # Incremental decoder: multi-byte characters split across blocks are kept whole
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with _open_binary(source) as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            text = decoder.decode(block)
+            if text:
+                yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def _iter_base64(f: BinaryIO, block_size: int = 3 * 64 * 1024) -> Iterator[str]:
+    """Base64 of a binary file in blocks; a multiple of 3 bytes per block needs no padding between them."""
+    for block in iter(lambda: f.read(block_size), b""):
+        yield base64.b64encode(block).decode("ascii")
+
+
+# ============================================================================
+# Audio transcription
+# ============================================================================
+
+def _transcribe(client: OpenAI, audio_file, file_name: str) -> str:
+    # The file name tells Whisper the container format
+    transcript = instrumented_call("summarize_audio", "whisper-1", lambda: client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(file_name, audio_file)
+    ))
+    return transcript.text
+
+
+def _plan_audio_segments(source: DocumentSource) -> Optional[List[Tuple[float, float]]]:
+    """Silence-aligned segments for a long recording on disk, or None to send it whole."""
+    if not isinstance(source, Path) or source.stat().st_size < getattr(settings, 'AUDIO_SPLIT_MIN_BYTES', 4 * 1024 * 1024):
+        return None
+    if not ffmpeg_available():
+        print("⚠️ ffmpeg not found, transcribing audio in one request")
+        return None
+    try:
+        duration, silences = probe_silences(
+            str(source),
+            noise_db=getattr(settings, 'AUDIO_SILENCE_THRESHOLD_DB', -35),
+            min_silence=getattr(settings, 'AUDIO_MIN_SILENCE_SECONDS', 0.5),
+            timeout=getattr(settings, 'AUDIO_FFMPEG_TIMEOUT', 600)
+        )
+    except Exception as e:
+        print(f"⚠️ Could not split audio, transcribing in one request: {e}")
+        return None
+
+    max_seconds = getattr(settings, 'AUDIO_SEGMENT_SECONDS', 600)
+    segments = plan_segments(duration, silences, max_seconds, min_seconds=max_seconds / 2)
+    return segments if len(segments) > 1 else None
+
+
+def _transcribe_segment(client: OpenAI, path: Path, segment: Tuple[float, float]) -> str:
+    segment_path = export_segment(
+        str(path), *segment,
+        bitrate=getattr(settings, 'AUDIO_SEGMENT_BITRATE', '48k'),
+        timeout=getattr(settings, 'AUDIO_FFMPEG_TIMEOUT', 600)
+    )
+    try:
+        with open(segment_path, "rb") as audio_file:
+            return _transcribe(client, audio_file, os.path.basename(segment_path))
+    finally:
+        os.unlink(segment_path)
+
+
+def _iter_transcript(client: OpenAI, source: DocumentSource, file_name: str) -> Iterator[str]:
+    """
+    Transcript text in order. Long recordings are cut at silences and the
+    segments transcribed concurrently; each is yielded as soon as it and
+    all earlier ones are done.
+    """
+    segments = _plan_audio_segments(source)
+    if segments is None:
+        with _open_binary(source) as audio_file:
+            yield _transcribe(client, audio_file, file_name)
+        return
+
+    print(f"🎙️ Transcribing {file_name} in {len(segments)} segments")
+    for text in _iter_ordered_map(
+        lambda segment: _transcribe_segment(client, source, segment), segments,
+        getattr(settings, 'AUDIO_TRANSCRIBE_CONCURRENCY', 4)
+    ):
+        yield text + "\n"
+
+
+# ============================================================================
+# Map / reduce
+# ============================================================================
+
+def _summarize_chunk(client: OpenAI, chunk: str) -> str:
+    # Section summaries depend only on the chunk text, so they are shared by
+    # every upload of the same file regardless of max_length or custom_prompt
+    cached = get_cached_summary("section", chunk, "gpt-4")
+    if cached is not None:
+        return cached
+
+    response = instrumented_call("summarize_document", "gpt-4", lambda: client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a concise summarizer."},
+            {"role": "user", "content": f"Summarize this section:\n\n{chunk}"}
+        ],
+        temperature=0.5
+    ))
+    summary = response.choices[0].message.content.strip()
+    set_cached_summary("section", chunk, "gpt-4", summary)
+    return summary
+
+
+def _combine_summaries(client: OpenAI, summaries: List[str]) -> str:
+    combined = "\n\n".join(summaries)
+    cached = get_cached_summary("combine", combined, "gpt-4")
+    if cached is not None:
+        return cached
+
+    response = instrumented_call("summarize_document", "gpt-4", lambda: client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are a concise summarizer."},
+            {"role": "user", "content": f"Combine these consecutive section summaries into one summary, keeping the key facts:\n\n{combined}"}
+        ],
+        temperature=0.5
+    ))
+    summary = response.choices[0].message.content.strip()
+    set_cached_summary("combine", combined, "gpt-4", summary)
+    return summary
+
+
+def _bounded_map(fn: Callable[[T], str], items: Iterable[T],
+                 on_done: Optional[Callable[[int], None]] = None) -> List[str]:
+    """
+    fn over items with at most DOCUMENT_SUMMARY_CONCURRENCY calls in flight,
+    results in input order. Items are pulled lazily, so no more than twice
+    the concurrency are held in memory while waiting for a worker.
+
+    on_done(completed_count) is called from the calling thread as calls finish.
+    """
+    workers = max(1, getattr(settings, 'DOCUMENT_SUMMARY_CONCURRENCY', 4))
+    if workers == 1:
+        results = []
+        for item in items:
+            results.append(fn(item))
+            if on_done:
+                on_done(len(results))
+        return results
+
+    futures = []
+    pending = set()
+    completed = 0
+
+    def wait_for_one():
+        nonlocal pending, completed
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        completed += len(done)
+        if on_done:
+            on_done(completed)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in items:
+            if len(pending) >= workers * 2:
+                wait_for_one()
+            # worker_call() keeps the llm_usage_scope user inside the worker threads
+            future = pool.submit(worker_call(fn), item)
+            futures.append(future)
+            pending.add(future)
+        while pending:
+            wait_for_one()
+        return [future.result() for future in futures]
+
+
+def _iter_ordered_map(fn: Callable[[T], str], items: Iterable[T], workers: int) -> Iterator[str]:
+    """
+    Lazy fn over items on a thread pool: yields results in input order as
+    soon as each is ready, with at most twice `workers` calls submitted ahead.
+    """
+    items = iter(items)
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def submit(item):
+        # worker_call() keeps the llm_usage_scope user inside the worker threads
+        return pool.submit(worker_call(fn), item)
+
+    try:
+        pending = deque(submit(item) for item in itertools.islice(items, max(1, workers) * 2))
+        while pending:
+            result = pending.popleft().result()
+            # Refill the slot just freed, if any items are left
+            for item in itertools.islice(items, 1):
+                pending.append(submit(item))
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _summarize_chunks(client: OpenAI, chunks: Iterable[str],
+                      progress: Optional[ProgressCallback] = None) -> List[str]:
+    """Map step: summarize chunks concurrently; summaries come back in chunk order."""
+    return _bounded_map(
+        lambda chunk: _summarize_chunk(client, chunk), chunks,
+        on_done=lambda completed: _report(progress, "summarizing", completed)
+    )
+
+
+def _reduce_summaries(client: OpenAI, summaries: List[str], max_tokens: int) -> str:
+    """
+    Tree reduce: while the joined summaries do not fit in max_tokens, combine
+    them in order in groups of DOCUMENT_REDUCE_FANOUT, one level at a time.
+    """
+    fanout = max(2, getattr(settings, 'DOCUMENT_REDUCE_FANOUT', 8))
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries), "gpt-4") > max_tokens:
+        groups = [summaries[i:i + fanout] for i in range(0, len(summaries), fanout)]
+        summaries = _bounded_map(lambda group: _combine_summaries(client, group), groups)
+    return "\n\n".join(summaries)
@@ -0,0 +1,151 @@
+"""
+Deterministic pre-router in front of the chatbot LLM.
+
+Greetings, thanks and "show my tasks/events today" style messages are matched
+against precompiled, fully-anchored patterns and answered directly from the
+database. Anything that does not match exactly returns None and goes to the LLM.
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo
+from django.db.models import Q
+from actions.models import Event, Task
+from . import metrics
+
+
+# The chatbot prompts assume users are in Asia/Dhaka (UTC+6)
+LOCAL_TZ = ZoneInfo("Asia/Dhaka")
+MAX_LISTED_ITEMS = 20
+
+_TRAILING = r"[\s!.,?😊🙂👋🙏]*$"
+
+GREETING_RE = re.compile(
+    r"^(?:hi|hello|hey|hiya|yo|good (?:morning|afternoon|evening)|assalamu? ?alaikum|salam)"
+    r"(?: there| saytask)?" + _TRAILING,
+    re.IGNORECASE
+)
+THANKS_RE = re.compile(
+    r"^(?:ok(?:ay)?,? )?(?:thanks|thank you|thank you so much|thanks a lot|thx|ty|great,? thanks)"
+    r"(?: so much| a lot)?" + _TRAILING,
+    re.IGNORECASE
+)
+AGENDA_RE = re.compile(
+    r"^(?:please )?(?:show|list|get|tell|give)(?: me)?(?: all)? my "
+    r"(?P<kind>tasks|todos|events|meetings|schedule|agenda|plans)"
+    r"(?: (?:for )?(?P<day>today|tomorrow))?" + _TRAILING,
+    re.IGNORECASE
+)
+AGENDA_QUESTION_RE = re.compile(
+    r"^(?:what|whats|what's|what are)(?: are)?(?: all)? my "
+    r"(?P<kind>tasks|todos|events|meetings|schedule|agenda|plans)"
+    r"(?: (?:for )?(?P<day>today|tomorrow))?" + _TRAILING
+    + r"|^what do i have (?P<day2>today|tomorrow)" + _TRAILING,
+    re.IGNORECASE
+)
+
+GREETING_REPLY = (
+    "Hi there! 👋 How can I help you today? I can schedule events, "
+    "add tasks or save notes for you."
+)
+THANKS_REPLY = "You're welcome! 😊 Let me know if there's anything else I can help with."
+
+FAST_PATH_INTENTS = ("greeting", "thanks", "agenda")
+
+
+def _normalize(message: str) -> str:
+    return re.sub(r"\s+", " ", message).strip()
+
+
+def _local_day_bounds(day: str):
+    local_now = datetime.now(LOCAL_TZ)
+    start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if day == "tomorrow":
+        start += timedelta(days=1)
+    return start, start + timedelta(days=1)
+
+
+def _format_time(value: Optional[datetime]) -> str:
+    return value.astimezone(LOCAL_TZ).strftime("%I:%M %p").lstrip("0") if value else ""
+
+
+def _agenda_reply(user, kind: str, day: str) -> str:
+    kind = kind.lower()
+    start, end = _local_day_bounds(day)
+    include_events = kind not in ("tasks", "todos")
+    include_tasks = kind not in ("events", "meetings")
+    lines = []
+
+    if include_events:
+        events = list(
+            Event.objects.filter(user=user, event_datetime__gte=start, event_datetime__lt=end)
+            .order_by("event_datetime")[:MAX_LISTED_ITEMS]
+        )
+        if events:
+            lines.append("📅 Events:")
+            lines.extend(f"• {_format_time(e.event_datetime)} — {e.title}" for e in events)
+
+    if include_tasks:
+        tasks = list(
+            Task.objects.filter(user=user)
+            .filter(Q(start_time__gte=start, start_time__lt=end) | Q(end_time__gte=start, end_time__lt=end))
+            .order_by("start_time", "end_time")[:MAX_LISTED_ITEMS]
+        )
+        if tasks:
+            lines.append("✅ Tasks:")
+            for t in tasks:
+                when = _format_time(t.start_time or t.end_time)
+                done = " (done)" if t.completed else ""
+                lines.append(f"• {when} — {t.title}{done}" if when else f"• {t.title}{done}")
+
+    label = {"tasks": "tasks", "todos": "tasks", "events": "events", "meetings": "events"}.get(kind, "plans")
+    if not lines:
+        return f"You don't have any {label} {day}. Enjoy the free time! 🎉"
+    return f"Here are your {label} for {day}:\n" + "\n".join(lines)
+
+
+def try_fast_path(user, message: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer a trivial chat turn without the LLM.
+
+    Returns a chatbot()-shaped result ({response_type, content}) or None when the
+    message is not a confident match.
+    """
+    text = _normalize(message)
+    intent = None
+    content = None
+
+    try:
+        if GREETING_RE.match(text):
+            intent, content = "greeting", GREETING_REPLY
+        elif THANKS_RE.match(text):
+            intent, content = "thanks", THANKS_REPLY
+        else:
+            match = AGENDA_RE.match(text) or AGENDA_QUESTION_RE.match(text)
+            if match:
+                groups = match.groupdict()
+                kind = groups.get("kind") or "schedule"
+                day = (groups.get("day") or groups.get("day2") or "today").lower()
+                intent, content = "agenda", _agenda_reply(user, kind, day)
+    except Exception as e:
+        print(f"⚠️ Fast path failed, falling back to LLM: {e}")
+        intent = None
+
+    if intent is None:
+        metrics.incr("fast_path", "misses")
+        return None
+
+    metrics.incr("fast_path", "hits")
+    metrics.incr("fast_path", f"{intent}.hits")
+    return {
+        "response_type": "response",
+        "content": content
+    }
+
+
+def get_fast_path_stats() -> Dict[str, Any]:
+    counters = metrics.get_counters(
+        "fast_path", ["hits", "misses"] + [f"{intent}.hits" for intent in FAST_PATH_INTENTS]
+    )
+    counters["hit_rate"] = metrics.hit_rate(counters["hits"], counters["misses"])
+    return counters
@@ -0,0 +1,117 @@
+"""
+Downscaling of uploaded images before Vision calls.
+
+GPT-4o never looks at more than a 2048px box with the short side scaled to
+768px, so larger photos only add upload time. Images are decoded, fitted
+to that size, re-encoded (JPEG, or PNG when they have transparency) without
+EXIF or other metadata, and cached by the SHA-256 of the upload.
+
+Pillow is in requirements.txt; if it is missing (logged once), or for images
+it cannot decode, callers get None and send the original file.
+"""
+import io
+from functools import lru_cache
+from typing import BinaryIO, NamedTuple, Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+from .document_cache import stream_sha256
+
+
+IMAGE_CACHE_KEY_PREFIX = "chatbot:image_prep"
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    original_bytes: int
+
+
+def _target_size(width: int, height: int, max_side: int, short_side: int):
+    scale = min(1.0, max_side / max(width, height), short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _record_savings(original_bytes: int, prepared_bytes: int) -> None:
+    metrics.incr('image_prep', 'images')
+    metrics.incr('image_prep', 'bytes_in', original_bytes)
+    metrics.incr('image_prep', 'bytes_out', prepared_bytes)
+
+
+@lru_cache(maxsize=1)
+def _load_pil():
+    try:
+        from PIL import Image, ImageOps
+        return Image, ImageOps
+    except ImportError as e:
+        print(f"⚠️ Pillow unavailable, images are sent to Vision without downscaling: {e}")
+        return None
+
+
+def prepare_image(f: BinaryIO) -> Optional[PreparedImage]:
+    """The image fitted to the Vision model's resolution, or None to send the original."""
+    pil = _load_pil()
+    if pil is None:
+        return None
+    Image, ImageOps = pil
+
+    max_side = getattr(settings, 'VISION_IMAGE_MAX_SIDE', 2048)
+    short_side = getattr(settings, 'VISION_IMAGE_SHORT_SIDE', 768)
+    quality = getattr(settings, 'VISION_IMAGE_QUALITY', 85)
+
+    f.seek(0, io.SEEK_END)
+    original_bytes = f.tell()
+    cache_key = f"{IMAGE_CACHE_KEY_PREFIX}:{stream_sha256(f)}:{max_side}:{short_side}:{quality}"
+    try:
+        cached = cache.get(cache_key)
+    except Exception:
+        cached = None
+    if cached is not None:
+        metrics.incr('image_prep', 'cache_hits')
+        _record_savings(original_bytes, len(cached['data']))
+        return PreparedImage(cached['data'], cached['mime_type'], original_bytes)
+
+    try:
+        image = Image.open(f)
+        # Let JPEG decode at a reduced scale when the target is much smaller
+        image.draft('RGB', _target_size(*image.size, max_side, short_side))
+        # Apply the EXIF rotation before the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        target = _target_size(*image.size, max_side, short_side)
+        if target != image.size:
+            image = image.resize(target, Image.Resampling.LANCZOS)
+
+        out = io.BytesIO()
+        if has_alpha:
+            image.save(out, format='PNG', optimize=True)
+            mime_type = 'image/png'
+        else:
+            image.save(out, format='JPEG', quality=quality, optimize=True, progressive=True)
+            mime_type = 'image/jpeg'
+        data = out.getvalue()
+    except Exception as e:
+        print(f"⚠️ Could not preprocess image, sending the original: {e}")
+        return None
+    finally:
+        f.seek(0)
+
+    if len(data) >= original_bytes:
+        # Already compact (e.g. a small screenshot): the original is cheaper to send
+        return None
+
+    _record_savings(original_bytes, len(data))
+    print(f"🖼️ Image downscaled to {image.size[0]}x{image.size[1]}: {original_bytes} -> {len(data)} bytes")
+    try:
+        cache.set(cache_key, {'data': data, 'mime_type': mime_type}, getattr(settings, 'DOCUMENT_CACHE_TTL', 60 * 60 * 24 * 7))
+    except Exception as e:
+        print(f"⚠️ Failed to cache preprocessed image: {e}")
+    return PreparedImage(data, mime_type, original_bytes)
+
+
+def get_image_prep_stats():
+    counters = metrics.get_counters('image_prep', ['images', 'cache_hits', 'bytes_in', 'bytes_out'])
+    counters['bytes_saved'] = counters['bytes_in'] - counters['bytes_out']
+    return counters
@@ -0,0 +1,118 @@
+"""
+Response cache for LLM calls whose output only depends on their inputs
+(classifier, note summaries, text summaries, document section summaries).
+
+Entries live in the default Django cache (Redis) under a SHA-256 of the
+normalized inputs. The number of entries is bounded by a ring of slots: every
+write claims the next slot and evicts whatever key previously owned it, so the
+cache never holds more than LLM_CACHE_MAX_ENTRIES responses regardless of the
+Redis eviction policy.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+LLM_CACHE_KEY_PREFIX = "chatbot:llm_cache"
+CACHE_NAMESPACES = ("classifier", "summarize_note", "summarize_text", "summarize_chunk")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def normalize_text(text: Optional[str], casefold: bool = False) -> str:
+    """Collapse runs of whitespace and trim, optionally case-folding."""
+    text = _WHITESPACE_RE.sub(" ", text or "").strip()
+    return text.casefold() if casefold else text
+
+
+def date_bucket() -> str:
+    """
+    Current hour bucket for prompts that embed the current date/time, so relative
+    phrases like "tomorrow at 5" are never answered from another day's entry.
+    """
+    return datetime.now().strftime("%Y-%m-%dT%H")
+
+
+def make_cache_key(namespace: str, **parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{LLM_CACHE_KEY_PREFIX}:{namespace}:{digest}"
+
+
+def history_fingerprint(convo_history: List[Dict]) -> List[List[str]]:
+    """Reduce conversation history to the parts that reach the prompt."""
+    return [
+        [msg.get("role", ""), normalize_text(msg.get("message"))]
+        for msg in convo_history or []
+        if msg.get("role") in ("user", "assistant")
+    ]
+
+
+def get_cached(namespace: str, key: str) -> Optional[Any]:
+    if not _setting("LLM_CACHE_ENABLED", True):
+        return None
+
+    try:
+        value = cache.get(key)
+    except Exception as e:
+        print(f"⚠️ LLM cache read failed: {e}")
+        return None
+
+    metrics.incr("llm_cache", f"{namespace}.hits" if value is not None else f"{namespace}.misses")
+    return value
+
+
+def set_cached(namespace: str, key: str, value: Any) -> None:
+    if not _setting("LLM_CACHE_ENABLED", True):
+        return
+
+    try:
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        if size > _setting("LLM_CACHE_MAX_VALUE_BYTES", 64 * 1024):
+            return
+
+        ttl = _setting("LLM_CACHE_TTL", 60 * 60 * 24)
+        max_entries = max(1, _setting("LLM_CACHE_MAX_ENTRIES", 10000))
+
+        # Claim the next slot in the ring and evict its previous owner
+        ring_key = f"{LLM_CACHE_KEY_PREFIX}:ring"
+        cache.add(ring_key, 0, timeout=None)
+        slot_key = f"{LLM_CACHE_KEY_PREFIX}:slot:{cache.incr(ring_key) % max_entries}"
+
+        previous = cache.get(slot_key)
+        if previous and previous != key:
+            cache.delete(previous)
+            metrics.incr("llm_cache", "evictions")
+
+        cache.set_many({key: value, slot_key: key}, timeout=ttl)
+        metrics.incr("llm_cache", f"{namespace}.stores")
+    except Exception as e:
+        print(f"⚠️ LLM cache write failed: {e}")
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters per cached function plus the global eviction count."""
+    stats = {}
+    for namespace in CACHE_NAMESPACES:
+        counters = metrics.get_counters(
+            "llm_cache", [f"{namespace}.hits", f"{namespace}.misses", f"{namespace}.stores"]
+        )
+        hits = counters[f"{namespace}.hits"]
+        misses = counters[f"{namespace}.misses"]
+        stats[namespace] = {
+            "hits": hits,
+            "misses": misses,
+            "stores": counters[f"{namespace}.stores"],
+            "hit_rate": metrics.hit_rate(hits, misses),
+        }
+    stats["evictions"] = metrics.get_counters("llm_cache", ["evictions"])["evictions"]
+    return stats
@@ -0,0 +1,233 @@
+"""
+Per-call instrumentation for every LLM request made by the chatbot app.
+
+Each call records model, prompt/completion tokens, wall time, estimated cost,
+retries (model-tier escalations) and parse failures into shared counters for
+the metrics endpoint. When a user is bound with llm_usage_scope(), the same
+numbers are also aggregated per user/route/model/day in LLMUsage, whose
+period_start lines up with UsageTracking's 'day' periods.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from . import metrics
+from .llm_router import DEFAULT_MODEL_TIERS, current_attempt, get_model_tiers
+
+
+T = TypeVar("T")
+
+# USD per 1M tokens (input, output)
+DEFAULT_MODEL_PRICING = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+}
+
+# Routes that are not tiered, with the models they call
+UNTIERED_ROUTES = {
+    "summarize_document": ["gpt-4"],
+    "summarize_image": ["gpt-4o"],
+    "summarize_audio": ["whisper-1", "gpt-4"],
+}
+
+CALL_FIELDS = (
+    "calls", "errors", "prompt_tokens", "completion_tokens", "latency_ms",
+    "cost_microusd", "retries", "parse_failures",
+)
+
+_current_user: ContextVar[Optional[Any]] = ContextVar("llm_usage_user", default=None)
+_call_budget: ContextVar[Optional[threading.BoundedSemaphore]] = ContextVar("llm_call_budget", default=None)
+
+
+@contextmanager
+def llm_usage_scope(user):
+    """Attribute every LLM call made inside the block to this user."""
+    token = _current_user.set(user if getattr(user, "is_authenticated", False) else None)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def current_llm_user():
+    return _current_user.get()
+
+
+@contextmanager
+def llm_concurrency_budget(limit: int):
+    """
+    Cap how many LLM calls made inside the block (including worker threads
+    started with copy_context()) run at the same time.
+    """
+    token = _call_budget.set(threading.BoundedSemaphore(max(1, limit)))
+    try:
+        yield
+    finally:
+        _call_budget.reset(token)
+
+
+def worker_call(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wrap fn for one ThreadPoolExecutor submit: it runs in a copy of the
+    caller's context (llm_usage_scope user, concurrency budget), and the DB
+    connections the worker thread opened to record LLMUsage are closed after.
+    Create one wrapper per submit; a copied context cannot run twice at once.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            connections.close_all()
+
+    return run
+
+
+def extract_token_usage(response: Any) -> Tuple[int, int]:
+    """(prompt_tokens, completion_tokens) from a LangChain message or an OpenAI response."""
+    if isinstance(response, dict) and "raw" in response:
+        response = response["raw"]
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int(usage.get("input_tokens") or 0), int(usage.get("output_tokens") or 0)
+
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+    return 0, 0
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    pricing = {**DEFAULT_MODEL_PRICING, **(getattr(settings, "LLM_MODEL_PRICING", None) or {})}
+    input_price, output_price = pricing.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return Decimal(str(round(cost, 6)))
+
+
+def instrumented_call(route: str, model: str, fn: Callable[[], T]) -> T:
+    """Run one LLM request and record its latency, tokens, cost and retry count."""
+    budget = _call_budget.get()
+    if budget is not None:
+        # Latency is measured from when the call gets its slot
+        with budget:
+            return _instrumented_call(route, model, fn)
+    return _instrumented_call(route, model, fn)
+
+
+def _instrumented_call(route: str, model: str, fn: Callable[[], T]) -> T:
+    retries = 1 if current_attempt.get() > 0 else 0
+    started = time.monotonic()
+    try:
+        response = fn()
+    except Exception:
+        _record(route, model, 0, 0, int((time.monotonic() - started) * 1000), retries, error=True)
+        raise
+
+    prompt_tokens, completion_tokens = extract_token_usage(response)
+    _record(route, model, prompt_tokens, completion_tokens, int((time.monotonic() - started) * 1000), retries)
+    return response
+
+
+def invoke_llm(route: str, llm, messages: list):
+    """Instrumented llm.invoke(messages) for LangChain chat models."""
+    return instrumented_call(route, llm.model_name, lambda: llm.invoke(messages))
+
+
+def record_parse_failure(route: str, model: str) -> None:
+    metrics.incr("llm_calls", f"{route}.{model}.parse_failures")
+    _persist_usage(route, model, parse_failures=1)
+
+
+def _record(route, model, prompt_tokens, completion_tokens, latency_ms, retries, error=False):
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    prefix = f"{route}.{model}"
+
+    metrics.incr("llm_calls", f"{prefix}.calls")
+    metrics.incr("llm_calls", f"{prefix}.latency_ms", latency_ms)
+    if error:
+        metrics.incr("llm_calls", f"{prefix}.errors")
+    if retries:
+        metrics.incr("llm_calls", f"{prefix}.retries", retries)
+    if prompt_tokens:
+        metrics.incr("llm_calls", f"{prefix}.prompt_tokens", prompt_tokens)
+    if completion_tokens:
+        metrics.incr("llm_calls", f"{prefix}.completion_tokens", completion_tokens)
+    if cost:
+        metrics.incr("llm_calls", f"{prefix}.cost_microusd", int(cost * 1_000_000))
+
+    _persist_usage(
+        route, model,
+        calls=1,
+        errors=int(error),
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_latency_ms=latency_ms,
+        cost_usd=cost,
+        retries=retries,
+    )
+
+
+def _persist_usage(route: str, model: str, **increments) -> None:
+    """Add the increments to the current user's LLMUsage row for today, if tracking is on."""
+    user = _current_user.get()
+    if user is None or not getattr(settings, "LLM_USAGE_TRACKING_ENABLED", True):
+        return
+
+    from subscription.utils import get_period_bounds
+    from .models import LLMUsage
+
+    period_start, period_end = get_period_bounds("day")
+    lookup = dict(user=user, route=route, model=model, period_start=period_start)
+    try:
+        updated = LLMUsage.objects.filter(**lookup).update(
+            **{field: F(field) + value for field, value in increments.items()}
+        )
+        if not updated:
+            try:
+                # Savepoint, so a lost race does not break a surrounding transaction
+                with transaction.atomic():
+                    LLMUsage.objects.create(period_end=period_end, **lookup, **increments)
+            except IntegrityError:
+                # Another worker created the row first
+                LLMUsage.objects.filter(**lookup).update(
+                    **{field: F(field) + value for field, value in increments.items()}
+                )
+    except Exception as e:
+        print(f"⚠️ Failed to record LLM usage for {user}: {e}")
+
+
+def get_llm_call_stats() -> Dict[str, Any]:
+    """Totals per route and model, with average latency and estimated cost in USD."""
+    routes = {route: get_model_tiers(route) for route in DEFAULT_MODEL_TIERS}
+    routes.update((getattr(settings, "LLM_MODEL_TIERS", None) or {}))
+    routes.update(UNTIERED_ROUTES)
+
+    stats = {}
+    for route, models in sorted(routes.items()):
+        route_stats = {}
+        for model in models:
+            counters = metrics.get_counters("llm_calls", [f"{route}.{model}.{field}" for field in CALL_FIELDS])
+            values = {field: counters[f"{route}.{model}.{field}"] for field in CALL_FIELDS}
+            calls = values["calls"]
+            route_stats[model] = {
+                "calls": calls,
+                "errors": values["errors"],
+                "retries": values["retries"],
+                "parse_failures": values["parse_failures"],
+                "prompt_tokens": values["prompt_tokens"],
+                "completion_tokens": values["completion_tokens"],
+                "avg_latency_ms": round(values["latency_ms"] / calls, 1) if calls else 0.0,
+                "cost_usd": round(values["cost_microusd"] / 1_000_000, 6),
+            }
+        stats[route] = route_stats
+    return stats
@@ -0,0 +1,110 @@
+"""
+Tiered model routing for the chatbot LLM calls.
+
+Each route (chatbot, classifier, ...) has an ordered list of models, cheapest
+and fastest first. A call is tried on the first tier and escalated to the next
+one only when its result is rejected (schema failure, low confidence) or the
+call itself fails. Latency and escalation counts are tracked per route.
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List
+from django.conf import settings
+from . import metrics
+
+
+DEFAULT_MODEL_TIERS = {
+    "chatbot": ["gpt-4o-mini", "gpt-4"],
+    "classifier": ["gpt-4o-mini", "gpt-4"],
+    "classifier_batch": ["gpt-4o-mini", "gpt-4"],
+    "summarize_note": ["gpt-4o-mini", "gpt-4"],
+    "summarize_text": ["gpt-4o-mini", "gpt-4"],
+    "whatsapp_chatbot": ["gpt-4o-mini", "gpt-4"],
+}
+
+
+# Index of the tier currently being tried (0 = first attempt), read by the instrumentation
+current_attempt: ContextVar[int] = ContextVar("llm_route_attempt", default=0)
+
+
+def get_model_tiers(route: str) -> List[str]:
+    """Models for a route in escalation order; LLM_MODEL_TIERS overrides the defaults."""
+    overrides = getattr(settings, "LLM_MODEL_TIERS", None) or {}
+    tiers = overrides.get(route) or DEFAULT_MODEL_TIERS.get(route) or ["gpt-4"]
+    return list(tiers)
+
+
+def escalation_confidence() -> float:
+    return getattr(settings, "LLM_ESCALATION_CONFIDENCE", 0.7)
+
+
+def run_routed(route: str, attempt: Callable[[str, bool], Any], accept: Callable[[Any], bool]) -> Any:
+    """
+    Run attempt(model, is_last_tier) on each tier until accept(result) is true.
+
+    The last tier's result is returned as-is, and its exceptions propagate, so
+    callers keep their existing error handling.
+    """
+    tiers = get_model_tiers(route)
+    started = time.monotonic()
+    metrics.incr("llm_route", f"{route}.calls")
+
+    try:
+        for index, model in enumerate(tiers):
+            is_last = index == len(tiers) - 1
+            attempt_started = time.monotonic()
+            attempt_token = current_attempt.set(index)
+            try:
+                result = attempt(model, is_last)
+            except Exception as e:
+                if is_last:
+                    raise
+                print(f"⚠️ {route} call on {model} failed, escalating: {e}")
+                result = None
+                accepted = False
+            else:
+                accepted = is_last or accept(result)
+            finally:
+                current_attempt.reset(attempt_token)
+                metrics.incr("llm_route", f"{route}.{model}.calls")
+                metrics.incr(
+                    "llm_route", f"{route}.{model}.latency_ms",
+                    int((time.monotonic() - attempt_started) * 1000)
+                )
+
+            if accepted:
+                return result
+            metrics.incr("llm_route", f"{route}.escalations")
+    finally:
+        metrics.incr("llm_route", f"{route}.latency_ms", int((time.monotonic() - started) * 1000))
+
+
+def get_route_stats() -> Dict[str, Any]:
+    """Per route: calls, escalation rate, average latency, and per-model attempts."""
+    routes = set(DEFAULT_MODEL_TIERS) | set((getattr(settings, "LLM_MODEL_TIERS", None) or {}).keys())
+    stats = {}
+    for route in sorted(routes):
+        tiers = get_model_tiers(route)
+        names = [f"{route}.calls", f"{route}.escalations", f"{route}.latency_ms"]
+        for model in tiers:
+            names += [f"{route}.{model}.calls", f"{route}.{model}.latency_ms"]
+        counters = metrics.get_counters("llm_route", names)
+
+        calls = counters[f"{route}.calls"]
+        escalations = counters[f"{route}.escalations"]
+        models = {}
+        for model in tiers:
+            model_calls = counters[f"{route}.{model}.calls"]
+            models[model] = {
+                "calls": model_calls,
+                "avg_latency_ms": round(counters[f"{route}.{model}.latency_ms"] / model_calls, 1) if model_calls else 0.0,
+            }
+        stats[route] = {
+            "tiers": tiers,
+            "calls": calls,
+            "escalations": escalations,
+            "escalation_rate": round(escalations / calls, 4) if calls else 0.0,
+            "avg_latency_ms": round(counters[f"{route}.latency_ms"] / calls, 1) if calls else 0.0,
+            "models": models,
+        }
+    return stats
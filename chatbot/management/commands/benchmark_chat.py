@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from twilio.request_validator import RequestValidator
+from authentication.models import UserAccount
+
+
+SAMPLE_MESSAGES = [
+    "Meeting with the design team tomorrow at 10am",
+    "Remind me to finish the quarterly report by Friday",
+    "Save a note: the wifi password is on the fridge",
+    "What's a good way to plan my week?",
+    "Lunch with Sara at 1pm on Thursday",
+    "I need to renew my passport next month",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the chat pipeline end-to-end with the offline replay LLM backend. "
+        "Runs against the configured database and needs no network access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per target')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--targets', default='chat,create,history,whatsapp',
+            help='Comma separated: chat, create, history, whatsapp'
+        )
+        parser.add_argument('--latency-ms', type=float, default=None,
+                            help='Fixed replay LLM latency (defaults to LLM_REPLAY_LATENCY)')
+        parser.add_argument('--email', default='benchmark@saytask.local')
+        parser.add_argument('--phone', default='+10000000000')
+        parser.add_argument('--keep-data', action='store_true', help='Keep the benchmark user and its data')
+
+    def handle(self, *args, **options):
+        overrides = {'LLM_BACKEND': 'replay', 'LLM_RATE_LIMIT_ENABLED': False}
+        if options['latency_ms'] is not None:
+            overrides['LLM_REPLAY_LATENCY'] = {'default': {'distribution': 'fixed', 'ms': options['latency_ms']}}
+
+        with override_settings(**overrides):
+            user, created = UserAccount.objects.get_or_create(
+                email=options['email'],
+                defaults={'full_name': 'Benchmark', 'is_active': True, 'phone_number': options['phone']}
+            )
+            try:
+                for target in [t.strip() for t in options['targets'].split(',') if t.strip()]:
+                    runner = getattr(self, f'_bench_{target}', None)
+                    if runner is None:
+                        self.stderr.write(f"Unknown target: {target}")
+                        continue
+                    self._run(target, runner, user, options['requests'], options['concurrency'], options)
+            finally:
+                if created and not options['keep_data']:
+                    user.delete()
+
+    def _run(self, name, runner, user, total, concurrency, options):
+        local = threading.local()
+        latencies = []
+        failures = []
+
+        def one(i):
+            if not hasattr(local, 'client'):
+                local.client = APIClient()
+                local.client.force_authenticate(user=user)
+            started = time.perf_counter()
+            try:
+                ok = runner(local.client, user, i, options)
+            except Exception as e:
+                ok = False
+                failures.append(str(e))
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                failures.append(f"request {i} failed")
+            connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+        self.stdout.write(
+            f"{name:<9} n={total} conc={concurrency} "
+            f"rps={total / elapsed:.1f} "
+            f"p50={pct(0.50):.1f}ms p95={pct(0.95):.1f}ms p99={pct(0.99):.1f}ms "
+            f"mean={statistics.mean(latencies) if latencies else 0:.1f}ms "
+            f"failures={len(failures)}"
+        )
+
+    def _bench_chat(self, client, user, i, options):
+        # Unique suffix so requests are not coalesced or served from caches
+        message = f"{SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]} (#{i})"
+        response = client.post('/chatbot/chat/', {'message': message}, format='json')
+        return response.status_code == 200
+
+    def _bench_create(self, client, user, i, options):
+        from chatbot.llm_backends import template_item
+        from chatbot.views import ChatBotView
+        item = template_item(SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]) or template_item("note")
+        item = {**item, 'response_type': item['type']}
+        return ChatBotView()._create_structured_data(user, item) is not None
+
+    def _bench_history(self, client, user, i, options):
+        response = client.get('/chatbot/history/')
+        return response.status_code == 200
+
+    def _bench_whatsapp(self, client, user, i, options):
+        url = 'http://testserver/chatbot/whatsapp/webhook/'
+        params = {
+            'From': f"whatsapp:{options['phone']}",
+            'To': f"whatsapp:{getattr(settings, 'TWILIO_PHONE_NUMBER', '')}",
+            'Body': f"{SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)]} (#{i})",
+        }
+        signature = RequestValidator(settings.TWILIO_AUTH_TOKEN).compute_signature(url, params)
+        response = client.post(url, params, HTTP_X_TWILIO_SIGNATURE=signature)
+        return response.status_code == 200
@@ -0,0 +1,39 @@
+"""
+Lightweight counters for the chatbot pipeline, stored in the shared Django cache
+(Redis in production) so every worker contributes to the same numbers.
+"""
+from typing import Dict, Iterable
+from django.core.cache import cache
+
+
+METRICS_KEY_PREFIX = "chatbot:metrics"
+
+
+def _metric_key(group: str, name: str) -> str:
+    return f"{METRICS_KEY_PREFIX}:{group}:{name}"
+
+
+def incr(group: str, name: str, amount: int = 1) -> None:
+    """Increment a counter. Metrics must never break the request, so errors are swallowed."""
+    key = _metric_key(group, name)
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+    except Exception as e:
+        print(f"⚠️ Failed to record metric {group}.{name}: {e}")
+
+
+def get_counters(group: str, names: Iterable[str]) -> Dict[str, int]:
+    """Return the current value of the given counters (missing counters read as 0)."""
+    names = list(names)
+    try:
+        values = cache.get_many([_metric_key(group, name) for name in names])
+    except Exception as e:
+        print(f"⚠️ Failed to read metrics for {group}: {e}")
+        values = {}
+    return {name: int(values.get(_metric_key(group, name), 0) or 0) for name in names}
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
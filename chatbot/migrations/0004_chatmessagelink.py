@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_chatmessage_user_created_at_index'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessageLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='chatbot.chatmessage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'object_id'], name='chatbot_cha_content_5aa019_idx')],
+                'unique_together': {('message', 'content_type', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+import uuid
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def _linked_ids(metadata):
+    """(item_type, object_id) pairs stored in a message's metadata."""
+    metadata = metadata or {}
+    pairs = []
+    if metadata.get('item_id'):
+        pairs.append((None, metadata['item_id']))
+    for entry in metadata.get('item_ids') or []:
+        if isinstance(entry, dict) and entry.get('id'):
+            pairs.append((entry.get('type'), entry['id']))
+    return pairs
+
+
+def backfill_links(apps, schema_editor):
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    ChatMessageLink = apps.get_model('chatbot', 'ChatMessageLink')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_types = {
+        model: ContentType.objects.get_or_create(app_label='actions', model=model)[0]
+        for model in ('event', 'task', 'note')
+    }
+
+    links = []
+    messages = (
+        ChatMessage.objects.filter(role='assistant', metadata__isnull=False)
+        .only('id', 'response_type', 'metadata')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for message in messages:
+        for item_type, item_id in _linked_ids(message.metadata):
+            content_type = content_types.get(item_type or message.response_type)
+            if content_type is None:
+                continue
+            try:
+                object_id = uuid.UUID(str(item_id))
+            except ValueError:
+                continue
+            links.append(ChatMessageLink(message_id=message.id, content_type=content_type, object_id=object_id))
+
+        if len(links) >= BATCH_SIZE:
+            ChatMessageLink.objects.bulk_create(links, ignore_conflicts=True)
+            links = []
+
+    if links:
+        ChatMessageLink.objects.bulk_create(links, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_chatmessagelink'),
+        ('actions', '0008_alter_event_options_remove_event_date_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_links, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_documentsummaryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessagelink',
+            name='archived_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='links', to='chatbot.archivedchatmessage'),
+        ),
+        migrations.AlterField(
+            model_name='chatmessagelink',
+            name='message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='links', to='chatbot.chatmessage'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+import uuid
+import zlib
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 
 User = get_user_model()
@@ -24,11 +28,185 @@ class ChatMessage(models.Model):
     )
     metadata = models.JSONField(null=True, blank=True) 
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the chat turn writer, which may save a turn after it happened
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination of a user's history on (created_at, id)
+            models.Index(fields=['user', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.role}: {self.content[:50]}"
 
+
+
+class ArchivedChatMessage(models.Model):
+    """
+    Cold copy of a ChatMessage older than CHAT_RETENTION_DAYS.
+
+    Content is zlib-compressed; rows are only read by explicit
+    "load archived" history requests.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_chat_messages')
+    role = models.CharField(max_length=10, choices=[('user', 'User'), ('assistant', 'Assistant')])
+    content_compressed = models.BinaryField()
+    response_type = models.CharField(max_length=20, null=True, blank=True)
+    metadata = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    @staticmethod
+    def compress(content):
+        return zlib.compress(content.encode('utf-8'), 6)
+
+    @property
+    def content(self):
+        return zlib.decompress(bytes(self.content_compressed)).decode('utf-8')
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(
+            original_id=message.id,
+            user_id=message.user_id,
+            role=message.role,
+            content_compressed=cls.compress(message.content),
+            response_type=message.response_type,
+            metadata=message.metadata,
+            created_at=message.created_at
+        )
+
+    def __str__(self):
+        return f"{self.user_id} - {self.role} (archived {self.original_id})"
+
+
+
+class ChatMessageLink(models.Model):
+    """
+    Indexed link from an assistant ChatMessage to the Event/Task/Note it created.
+
+    When the message is archived the link is moved to its ArchivedChatMessage,
+    so exactly one of message / archived_message is set.
+    """
+    message = models.ForeignKey(ChatMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='links')
+    archived_message = models.ForeignKey(
+        ArchivedChatMessage, on_delete=models.CASCADE, null=True, blank=True, related_name='links'
+    )
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.UUIDField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['message', 'content_type', 'object_id']
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+        ]
+
+    def __str__(self):
+        source = self.message_id or f"archived {self.archived_message_id}"
+        return f"{source} -> {self.content_type.model}:{self.object_id}"
+
+
+def chat_messages_for_item(obj):
+    """Chat messages that created (or reference) an Event/Task/Note."""
+    return ChatMessage.objects.filter(
+        links__content_type=ContentType.objects.get_for_model(obj),
+        links__object_id=obj.pk
+    )
+
+
+def archived_chat_messages_for_item(obj):
+    """Same as chat_messages_for_item, for messages already moved to the archive."""
+    return ArchivedChatMessage.objects.filter(
+        links__content_type=ContentType.objects.get_for_model(obj),
+        links__object_id=obj.pk
+    )
+
+
+
+class DocumentSummaryJob(models.Model):
+    """A document summarization run in the background (see chatbot.tasks.run_document_summary_job)."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_summary_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Progress: extracting -> summarizing (chunks_done counts up) -> reducing -> combining
+    stage = models.CharField(max_length=20, blank=True, default='')
+    chunks_done = models.PositiveIntegerField(default=0)
+
+    file_name = models.CharField(max_length=255)
+    file_size = models.PositiveBigIntegerField(default=0)
+    # Upload waiting for the worker, under DOCUMENT_JOB_UPLOAD_DIR; cleared once the job finishes
+    upload_path = models.CharField(max_length=500, blank=True, default='')
+    max_length = models.PositiveIntegerField(default=500)
+    custom_prompt = models.TextField(null=True, blank=True)
+
+    summary = models.TextField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+
+class LLMUsage(models.Model):
+    """Daily per-user LLM token/cost aggregate, aligned with UsageTracking 'day' periods."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='llm_usage')
+    route = models.CharField(max_length=50)
+    model = models.CharField(max_length=50)
+    period_start = models.DateTimeField(db_index=True)
+    period_end = models.DateTimeField()
+
+    calls = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    parse_failures = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    total_latency_ms = models.PositiveBigIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "LLM Usage"
+        unique_together = ['user', 'route', 'model', 'period_start']
+        indexes = [
+            models.Index(fields=['user', 'period_start']),
+        ]
+        ordering = ['-period_start', 'route']
+
+    def __str__(self):
+        return f"{self.user.email} - {self.route}/{self.model} ({self.prompt_tokens}+{self.completion_tokens} tokens)"
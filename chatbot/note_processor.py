@@ -1,21 +1,23 @@
 import os
 import json
-from typing import Dict, Any
-from langchain_openai import ChatOpenAI
+from typing import Dict, Any, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
 from django.conf import settings
+from .llm_router import run_routed, get_model_tiers
+from .llm_backends import get_chat_model
+from .llm_instrumentation import invoke_llm, record_parse_failure
+from .llm_cache import get_cached, set_cached, make_cache_key, normalize_text
 
 
 def summarize_note(raw_note: str) -> Dict[str, Any]:
+
+    cache_key = make_cache_key("summarize_note", note=normalize_text(raw_note), model=get_model_tiers("summarize_note"))
+    cached = get_cached("summarize_note", cache_key)
+    if cached is not None:
+        return cached
     
     api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
     
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=0.9,
-        openai_api_key=api_key
-    )
-    
     system_prompt = """You are a note summarizer. Transform messy notes into clean, structured summaries.
 
     Output as JSON:
@@ -36,10 +38,30 @@ def summarize_note(raw_note: str) -> Dict[str, Any]:
         HumanMessage(content=f"Summarize:\n\n{raw_note}")
     ]
     
-    response = llm.invoke(messages)
-    
+    def attempt(model, is_last):
+        llm = get_chat_model("summarize_note", model, temperature=0.9, api_key=api_key)
+        response = invoke_llm("summarize_note", llm, messages)
+        summary = _parse_summary(response.content)
+        if summary is None:
+            record_parse_failure("summarize_note", model)
+        return summary
+
+    # Escalate to the next model tier when the reply is not valid JSON or is empty
+    summary = run_routed("summarize_note", attempt, accept=lambda result: bool(result and result["summary"]))
+    if summary is None:
+        return {
+            "summary": raw_note[:300] + "..." if len(raw_note) > 300 else raw_note,
+            "points": []
+        }
+
+    if summary["summary"]:
+        set_cached("summarize_note", cache_key, summary)
+    return summary
+
+
+def _parse_summary(content: str) -> Optional[Dict[str, Any]]:
     try:
-        content = response.content.strip()
+        content = content.strip()
         if content.startswith("```json"):
             content = content[7:]
         if content.startswith("```"):
@@ -55,9 +77,6 @@ def summarize_note(raw_note: str) -> Dict[str, Any]:
             "points": result.get("points", [])
         }
         
-    except (json.JSONDecodeError, ValueError) as e:
+    except (json.JSONDecodeError, ValueError, AttributeError) as e:
         print(f"⚠️ Summarizer error: {e}")
-        return {
-            "summary": raw_note[:300] + "..." if len(raw_note) > 300 else raw_note,
-            "points": []
-        }
+        return None
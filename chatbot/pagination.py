@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination for chat history.
+
+A cursor is an opaque, URL-safe token for one message's (created_at, id).
+Pages are read with `before=<cursor>` (older messages) or `after=<cursor>`
+(newer messages) using a row comparison on (created_at, id), so every page
+is an index range scan on (user, created_at) no matter how deep it is.
+"""
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db.models import Q, QuerySet
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(message) -> str:
+    raw = f"{message.created_at.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def parse_limit(value: Optional[str]) -> int:
+    default = getattr(settings, "CHAT_HISTORY_PAGE_SIZE", 50)
+    maximum = getattr(settings, "CHAT_HISTORY_MAX_PAGE_SIZE", 200)
+    if value in (None, ""):
+        return default
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        raise InvalidCursor(f"Invalid limit: {value}")
+
+
+def paginate_keyset(queryset: QuerySet, limit: int, before: Optional[str] = None,
+                    after: Optional[str] = None) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    One page of `queryset` in chronological order plus its cursors.
+
+    With no cursor the newest `limit` rows are returned. Returns
+    (rows, {"older_cursor", "newer_cursor", "has_older", "has_newer"}).
+    """
+    if before and after:
+        raise InvalidCursor("Use either before or after, not both")
+
+    if after:
+        created_at, pk = decode_cursor(after)
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by("created_at", "pk")[:limit + 1]
+        )
+        has_newer = len(rows) > limit
+        rows = rows[:limit]
+        has_older = True
+    else:
+        if before:
+            created_at, pk = decode_cursor(before)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        rows = list(queryset.order_by("-created_at", "-pk")[:limit + 1])
+        has_older = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_newer = bool(before)
+
+    return rows, {
+        "older_cursor": encode_cursor(rows[0]) if rows else before,
+        "newer_cursor": encode_cursor(rows[-1]) if rows else after,
+        "has_older": has_older,
+        "has_newer": has_newer,
+    }
@@ -0,0 +1,102 @@
+"""
+PDF text extraction fanned out over worker processes.
+
+PyPDF2's extract_text is pure Python and CPU bound, so long PDFs are split
+into page ranges that are extracted in a process pool. Pages are yielded in
+order as soon as their range is done, so chunking and summarizing start
+before the last page is parsed.
+
+The pool is created once per process and shared by every extraction, so
+concurrent uploads (and batch summaries) queue for the same workers instead
+of each spawning their own interpreters.
+
+This module has no Django imports so spawned workers can import it cheaply.
+"""
+import mmap
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterator, List, Optional
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def _mapped_reader(path: str):
+    """PdfReader over a read-only memory map of the file."""
+    import PyPDF2
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PyPDF2.PdfReader(mapped)
+
+
+def _page_text(page) -> str:
+    return (page.extract_text() or "") + "\n"
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end); runs in a worker process."""
+    with _mapped_reader(path) as reader:
+        return [_page_text(reader.pages[i]) for i in range(start, end)]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """The shared extraction pool, started on first use with `workers` processes."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web/worker process can deadlock on inherited locks
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (e.g. a worker was killed) so the next call starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_pdf_pages(path: str, workers: int = 4, pages_per_task: int = 8,
+                   min_parallel_pages: int = 16) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF on disk, in page order.
+
+    PDFs shorter than min_parallel_pages, and callers that cannot start
+    child processes (e.g. daemonic Celery prefork workers), extract serially.
+    """
+    with _mapped_reader(path) as reader:
+        page_count = len(reader.pages)
+        if workers <= 1 or page_count < min_parallel_pages or multiprocessing.current_process().daemon:
+            for page in reader.pages:
+                yield _page_text(page)
+            return
+
+    pages_per_task = max(1, pages_per_task)
+    ranges = iter([(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)])
+    pool = _get_pool(workers)
+    pending = deque()
+    try:
+        # Keep at most twice the pool size of ranges in flight; collect them in order
+        pending.extend(pool.submit(extract_page_range, path, start, end) for start, end in islice(ranges, workers * 2))
+        while pending:
+            pages = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(extract_page_range, path, *next_range))
+            yield from pages
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # Also reached when the consumer stops early: drop ranges not started yet
+        for future in pending:
+            future.cancel()
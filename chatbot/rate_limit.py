@@ -0,0 +1,190 @@
+"""
+Per-user LLM rate and concurrency limiter backed by Redis.
+
+Each user gets a token bucket (sustained requests per minute plus a burst)
+and a semaphore capping how many LLM-backed requests they can have in flight.
+Both are checked and taken in a single Lua script, so one request costs one
+Redis round trip to admit and one to release.
+
+Limits come from SubscriptionPlan.features["llm_rate_limit"], e.g.
+    {"llm_rate_limit": {"per_minute": 30, "burst": 10, "concurrency": 3}}
+with LLM_RATE_LIMIT_DEFAULTS filling in anything a plan does not set. The
+limiter fails open: if Redis is unreachable requests are let through.
+"""
+import math
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+RATE_LIMIT_SCOPES = ("chat", "classify", "summarize_note", "document", "whatsapp")
+
+# KEYS: bucket hash, semaphore zset
+# ARGV: now_ms, refill tokens per ms, burst, cost, concurrency, holder id, holder ttl ms
+# Returns {admitted (0/1), retry_after_ms, reason}
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local concurrency = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[7])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if concurrency > 0 and redis.call('ZCARD', KEYS[2]) >= concurrency then
+    return {0, 1000, 'concurrency'}
+end
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+if tokens < cost then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate))
+    return {0, math.ceil((cost - tokens) / rate), 'rate'}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate))
+if concurrency > 0 then
+    redis.call('ZADD', KEYS[2], now + ttl, ARGV[6])
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return {1, 0, ''}
+"""
+
+_client = None
+_acquire_script = None
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: int, reason: str = "rate"):
+        super().__init__(f"LLM {reason} limit reached, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _redis():
+    """Raw redis client on the cache's Redis, with the acquire script registered."""
+    global _client, _acquire_script
+    if _client is None:
+        import redis
+        location = settings.CACHES["default"]["LOCATION"]
+        _client = redis.Redis.from_url(location[0] if isinstance(location, (list, tuple)) else location)
+        _acquire_script = _client.register_script(_ACQUIRE_LUA)
+    return _client, _acquire_script
+
+
+def get_user_limits(user) -> Dict[str, Any]:
+    """The user's plan limits merged over LLM_RATE_LIMIT_DEFAULTS (cached briefly)."""
+    defaults = dict(getattr(settings, "LLM_RATE_LIMIT_DEFAULTS", None) or {})
+    cache_key = f"chatbot:llm_limits:{user.pk}"
+    try:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    except Exception:
+        cached = None
+
+    limits = dict(defaults)
+    try:
+        features = user.subscriptions.plan.features or {}
+        limits.update(features.get("llm_rate_limit") or {})
+    except Exception:
+        # No subscription or plan: default limits
+        pass
+
+    try:
+        cache.set(cache_key, limits, 60)
+    except Exception:
+        pass
+    return limits
+
+
+def acquire(user, scope: str, cost: int = 1) -> Optional[str]:
+    """
+    Take `cost` tokens and one concurrency slot for the user.
+
+    Returns a holder id to pass to release() (None when nothing was held),
+    or raises RateLimited with a Retry-After in seconds.
+    """
+    if not getattr(settings, "LLM_RATE_LIMIT_ENABLED", True) or not getattr(user, "is_authenticated", False):
+        return None
+
+    limits = get_user_limits(user)
+    per_minute = float(limits.get("per_minute") or 0)
+    if per_minute <= 0:
+        return None
+    burst = max(float(limits.get("burst") or per_minute), float(cost))
+    concurrency = int(limits.get("concurrency") or 0)
+    holder_ttl_ms = int(getattr(settings, "LLM_RATE_LIMIT_HOLD_TIMEOUT", 300) * 1000)
+
+    holder = uuid.uuid4().hex
+    try:
+        _, script = _redis()
+        admitted, retry_after_ms, reason = script(
+            keys=[f"llm_rl:{user.pk}:bucket", f"llm_rl:{user.pk}:inflight"],
+            args=[int(time.time() * 1000), per_minute / 60000, burst, cost, concurrency, holder, holder_ttl_ms]
+        )
+    except Exception as e:
+        print(f"⚠️ LLM rate limiter unavailable, allowing request: {e}")
+        return None
+
+    if not admitted:
+        metrics.incr("llm_rate_limit", f"{scope}.limited")
+        retry_after = max(1, math.ceil(int(retry_after_ms) / 1000))
+        raise RateLimited(retry_after, reason.decode() if isinstance(reason, bytes) else reason)
+
+    metrics.incr("llm_rate_limit", f"{scope}.allowed")
+    return holder if concurrency > 0 else None
+
+
+def release(user, holder: Optional[str]) -> None:
+    if not holder:
+        return
+    try:
+        client, _ = _redis()
+        client.zrem(f"llm_rl:{user.pk}:inflight", holder)
+    except Exception as e:
+        # The slot expires after LLM_RATE_LIMIT_HOLD_TIMEOUT anyway
+        print(f"⚠️ Failed to release LLM concurrency slot: {e}")
+
+
+@contextmanager
+def llm_rate_limit(user, scope: str, cost: int = 1):
+    """Hold a rate/concurrency slot for the block; raises RateLimited before entering."""
+    holder = acquire(user, scope, cost)
+    try:
+        yield
+    finally:
+        release(user, holder)
+
+
+def rate_limited_response(exc: RateLimited):
+    """DRF 429 response with Retry-After."""
+    from rest_framework import status
+    from rest_framework.response import Response
+
+    return Response({
+        "error": "Too many requests",
+        "details": str(exc),
+        "retry_after": exc.retry_after
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(exc.retry_after)})
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    names = [f"{scope}.{outcome}" for scope in RATE_LIMIT_SCOPES for outcome in ("allowed", "limited")]
+    counters = metrics.get_counters("llm_rate_limit", names)
+    return {
+        scope: {
+            "allowed": counters[f"{scope}.allowed"],
+            "limited": counters[f"{scope}.limited"],
+        }
+        for scope in RATE_LIMIT_SCOPES
+    }
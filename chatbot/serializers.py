@@ -1,9 +1,28 @@
 from rest_framework import serializers
-from .models import ChatMessage
+from .models import ArchivedChatMessage, ChatMessage, DocumentSummaryJob
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = ['role', 'content', 'created_at', 'response_type', 'metadata']
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+
+class ArchivedChatMessageSerializer(serializers.ModelSerializer):
+    content = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = ArchivedChatMessage
+        fields = ['role', 'content', 'created_at', 'response_type', 'metadata']
+        read_only_fields = fields
+
+
+class DocumentSummaryJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentSummaryJob
+        fields = [
+            'id', 'status', 'stage', 'chunks_done', 'file_name', 'file_size',
+            'summary', 'error', 'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = fields
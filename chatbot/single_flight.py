@@ -0,0 +1,114 @@
+"""
+Single-flight coalescing for expensive, duplicate-prone requests.
+
+Mobile clients retry on timeout, so the same chat/summarize request can arrive
+several times while the first LLM call is still running. The first request
+takes a Redis lock (cache.add is SET NX) and runs the work; duplicates poll for
+the stored result instead of paying for a parallel LLM call.
+
+Without a client Idempotency-Key only requests that overlap the leader are
+merged: a later, genuine repeat of a short message ("yes", "delete it") is a
+new turn and must not get the previous reply.
+"""
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Callable, Optional
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+
+SINGLE_FLIGHT_KEY_PREFIX = "chatbot:single_flight"
+POLL_INTERVAL = 0.25
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def request_fingerprint(user_id: Any, scope: str, payload: dict,
+                        idempotency_key: Optional[str] = None) -> str:
+    """Hash of user + endpoint + request payload (+ client idempotency key) used as the coalescing key."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{scope}:{user_id}:{idempotency_key or ''}:{raw}".encode("utf-8")).hexdigest()
+
+
+def run_single_flight(key: str, fn: Callable[[], Any],
+                      should_store: Optional[Callable[[Any], bool]] = None,
+                      replay: bool = False) -> Any:
+    """
+    Run fn() once per key across all workers.
+
+    Followers wait for the result of the leader that was running when they
+    arrived; once it is done the next request with the key runs fn() again.
+    With replay=True (the key carries a client idempotency key) the result is
+    also returned to retries arriving up to SINGLE_FLIGHT_RESULT_TTL seconds
+    after the leader finished. If the leader fails without storing anything,
+    followers run fn() themselves.
+    """
+    lock_key = f"{SINGLE_FLIGHT_KEY_PREFIX}:lock:{key}"
+    replay_key = f"{SINGLE_FLIGHT_KEY_PREFIX}:result:{key}"
+    token = uuid.uuid4().hex
+    result_ttl = _setting("SINGLE_FLIGHT_RESULT_TTL", 30)
+
+    try:
+        if replay:
+            stored = cache.get(replay_key)
+            if stored is not None:
+                metrics.incr("single_flight", "coalesced")
+                return stored
+        acquired = cache.add(lock_key, token, timeout=_setting("SINGLE_FLIGHT_LOCK_TIMEOUT", 120))
+        # Followers only read the result of this particular leader run
+        leader_token = token if acquired else cache.get(lock_key)
+    except Exception as e:
+        # No coalescing without Redis, but the request itself must still succeed
+        print(f"⚠️ Single-flight unavailable: {e}")
+        return fn()
+
+    if acquired:
+        metrics.incr("single_flight", "leaders")
+        try:
+            result = fn()
+            if should_store is None or should_store(result):
+                try:
+                    cache.set(f"{replay_key}:{token}", result, timeout=result_ttl)
+                    if replay:
+                        cache.set(replay_key, result, timeout=result_ttl)
+                except Exception as e:
+                    print(f"⚠️ Failed to store single-flight result: {e}")
+            return result
+        finally:
+            try:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            except Exception:
+                pass
+
+    if leader_token is None:
+        # The leader finished between cache.add and cache.get
+        metrics.incr("single_flight", "fallthrough")
+        return fn()
+
+    result_key = f"{replay_key}:{leader_token}"
+    deadline = time.monotonic() + _setting("SINGLE_FLIGHT_WAIT_TIMEOUT", 90)
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            stored = cache.get(result_key)
+            if stored is not None:
+                metrics.incr("single_flight", "coalesced")
+                return stored
+            if cache.get(lock_key) != leader_token:
+                # Leader finished without a storable result (e.g. it errored)
+                break
+    except Exception as e:
+        print(f"⚠️ Single-flight wait failed: {e}")
+
+    metrics.incr("single_flight", "fallthrough")
+    return fn()
+
+
+def get_single_flight_stats() -> dict:
+    return metrics.get_counters("single_flight", ["leaders", "coalesced", "fallthrough"])
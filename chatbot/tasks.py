@@ -0,0 +1,195 @@
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import os
+from .models import ArchivedChatMessage, ChatMessage, ChatMessageLink, DocumentSummaryJob
+
+
+
+
+@shared_task
+def archive_old_chat_messages():
+    """
+    Move chat messages older than CHAT_RETENTION_DAYS into ArchivedChatMessage.
+
+    Works oldest-first in CHAT_ARCHIVE_BATCH_SIZE chunks, each copied and
+    deleted in its own transaction, and stops after CHAT_ARCHIVE_MAX_BATCHES
+    so one run never holds long locks; the next beat run picks up the rest.
+    ChatMessageLink rows move to the archived copy, so the "which chat created
+    this item" lookup keeps working after archival.
+    """
+    retention_days = getattr(settings, 'CHAT_RETENTION_DAYS', 90)
+    batch_size = getattr(settings, 'CHAT_ARCHIVE_BATCH_SIZE', 1000)
+    max_batches = getattr(settings, 'CHAT_ARCHIVE_MAX_BATCHES', 50)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    archived = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            batch = list(
+                ChatMessage.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at', 'id')
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            # original_id is unique, so a retried batch never duplicates rows
+            ArchivedChatMessage.objects.bulk_create(
+                [ArchivedChatMessage.from_message(message) for message in batch],
+                ignore_conflicts=True
+            )
+            message_ids = [message.id for message in batch]
+            # Move links to the archived copies before the delete cascades to them
+            archived_ids = dict(
+                ArchivedChatMessage.objects.filter(original_id__in=message_ids).values_list('original_id', 'id')
+            )
+            links = list(ChatMessageLink.objects.filter(message_id__in=message_ids))
+            for link in links:
+                link.archived_message_id = archived_ids[link.message_id]
+                link.message = None
+            ChatMessageLink.objects.bulk_update(links, ['message', 'archived_message'], batch_size=batch_size)
+            ChatMessage.objects.filter(id__in=message_ids).delete()
+
+        archived += len(batch)
+
+    if archived:
+        print(f"🗄️ Archived {archived} chat messages older than {retention_days} days")
+    return {'archived': archived, 'cutoff': cutoff.isoformat()}
+
+
+
+
+@shared_task(bind=True, max_retries=3)
+def persist_chat_turn(self, turn):
+    """Write a deferred chat turn (see chatbot.chat_turns)."""
+    from .chat_turns import save_turn
+
+    try:
+        save_turn(turn)
+        return {'status': 'saved', 'turn_id': turn['turn_id']}
+    except Exception as e:
+        print(f"❌ Error saving chat turn {turn.get('turn_id')}: {e}")
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+
+
+
+
+def _remove_upload(path):
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+# Retries are only used to wait for the rate limiter and are capped in the task
+@shared_task(bind=True, max_retries=None)
+def run_document_summary_job(self, job_id):
+    """
+    Summarize an uploaded document for a DocumentSummaryJob, recording the
+    pipeline stage on the job as it goes. The upload is deleted afterwards.
+
+    The job holds the user's 'document' rate/concurrency slot while it runs;
+    when the limit is full it stays queued and is retried after Retry-After,
+    up to DOCUMENT_JOB_RATE_LIMIT_RETRIES times.
+    """
+    from .rate_limit import RateLimited, acquire, release
+
+    job = DocumentSummaryJob.objects.select_related('user').filter(id=job_id, status='queued').first()
+    if job is None:
+        return {'status': 'skipped', 'job_id': str(job_id)}
+
+    try:
+        holder = acquire(job.user, 'document')
+    except RateLimited as e:
+        if self.request.retries < getattr(settings, 'DOCUMENT_JOB_RATE_LIMIT_RETRIES', 20):
+            # Waiting on the limiter counts as progress for fail_stale_document_jobs
+            DocumentSummaryJob.objects.filter(id=job_id, status='queued').update(updated_at=timezone.now())
+            raise self.retry(countdown=e.retry_after)
+        DocumentSummaryJob.objects.filter(id=job_id, status='queued').update(
+            status='failed', error=str(e), upload_path='',
+            completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        _remove_upload(job.upload_path)
+        return {'status': 'failed', 'job_id': str(job_id)}
+
+    try:
+        # Only one worker may pick up a job, even if the message is delivered twice
+        claimed = DocumentSummaryJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=timezone.now(), updated_at=timezone.now()
+        )
+        if not claimed:
+            return {'status': 'skipped', 'job_id': str(job_id)}
+        return _summarize_job(job)
+    finally:
+        release(job.user, holder)
+
+
+def _summarize_job(job):
+    from .document_summarizer import summarize_document
+    from .llm_instrumentation import llm_usage_scope
+
+    job_id = job.id
+    # Every write is conditional on 'running' so a job failed by the stale-job
+    # reaper is not brought back by a worker that was only slow
+    running = DocumentSummaryJob.objects.filter(id=job_id, status='running')
+
+    def progress(stage, chunks_done):
+        fields = {'stage': stage, 'updated_at': timezone.now()}
+        if chunks_done is not None:
+            fields['chunks_done'] = chunks_done
+        running.update(**fields)
+
+    try:
+        with llm_usage_scope(job.user):
+            result = summarize_document(job.upload_path, job.max_length, job.custom_prompt, progress=progress)
+        running.update(
+            status='completed', stage='done', summary=result['summary'],
+            upload_path='', completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        return {'status': 'completed', 'job_id': str(job_id)}
+    except Exception as e:
+        print(f"❌ Document summary job {job_id} failed: {e}")
+        running.update(
+            status='failed', error=str(e), upload_path='',
+            completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        return {'status': 'failed', 'job_id': str(job_id)}
+    finally:
+        _remove_upload(job.upload_path)
+
+
+
+
+@shared_task
+def fail_stale_document_jobs():
+    """
+    Fail document jobs that have made no progress for DOCUMENT_JOB_STALE_AFTER
+    seconds (e.g. the worker died after claiming them, or the task message was
+    lost) and delete their uploads from DOCUMENT_JOB_UPLOAD_DIR.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'DOCUMENT_JOB_STALE_AFTER', 60 * 60))
+    stale = list(
+        DocumentSummaryJob.objects.filter(status__in=['queued', 'running'], updated_at__lt=cutoff)
+        .values_list('id', 'upload_path')
+    )
+
+    failed = 0
+    for job_id, upload_path in stale:
+        # Re-check the status so a job that just finished is left alone
+        updated = DocumentSummaryJob.objects.filter(
+            id=job_id, status__in=['queued', 'running'], updated_at__lt=cutoff
+        ).update(
+            status='failed', error='Job timed out', upload_path='',
+            completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        if updated:
+            failed += 1
+            try:
+                _remove_upload(upload_path)
+            except OSError as e:
+                print(f"⚠️ Failed to remove upload of stale document job {job_id}: {e}")
+
+    if failed:
+        print(f"🧹 Failed {failed} stale document summary jobs")
+    return {'failed': failed}
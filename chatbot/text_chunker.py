@@ -0,0 +1,134 @@
+"""
+Token-aware chunking for long documents.
+
+Text is split on paragraph, line and sentence boundaries (including CJK
+sentence punctuation) and packed greedily into chunks measured in model
+tokens, so each LLM call gets as much text as fits without cutting sentences.
+Consecutive chunks can share an overlap of trailing sentences for context.
+
+Input is a stream of text pieces (pages, paragraphs, file blocks) and chunks
+are yielded as soon as they are full, so the whole document is never held
+in memory.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+
+# Paragraph break, line break, or whitespace after sentence-ending punctuation;
+# CJK full stops end a sentence even without following whitespace
+BOUNDARY_RE = re.compile(r"\n\s*\n|(?<=[.!?])\s+|(?<=[。！？])\s*|\n")
+
+# A run this long with no boundary is emitted as a segment and split by tokens
+MAX_PENDING_CHARS = 100_000
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken missing, or its BPE files cannot be downloaded
+        print(f"⚠️ tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly 4 ASCII characters per token, about one token per other character
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def _split_by_tokens(text: str, max_tokens: int, model: str) -> List[str]:
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    parts = []
+    while text:
+        # Shrink the slice until the estimate fits
+        size = min(len(text), max_tokens * 4)
+        while size > 1 and count_tokens(text[:size], model) > max_tokens:
+            size //= 2
+        parts.append(text[:size])
+        text = text[size:]
+    return parts
+
+
+def iter_segments(pieces: Iterable[str]) -> Iterator[str]:
+    """Re-split streamed text pieces into sentence/paragraph segments (with their trailing whitespace)."""
+    pending = ""
+    for piece in pieces:
+        pending += piece
+        position = 0
+        for match in BOUNDARY_RE.finditer(pending):
+            if match.end() > position:
+                yield pending[position:match.end()]
+                position = match.end()
+        pending = pending[position:]
+        if len(pending) > MAX_PENDING_CHARS:
+            yield pending
+            pending = ""
+    if pending:
+        yield pending
+
+
+def iter_token_chunks(pieces: Iterable[str], max_tokens: int, overlap_tokens: int = 0,
+                      model: str = "gpt-4") -> Iterator[str]:
+    """
+    Pack streamed text into chunks of at most max_tokens tokens.
+
+    Chunks end on a segment boundary whenever possible; a single segment longer
+    than max_tokens is split by tokens. Up to overlap_tokens of trailing
+    segments are repeated at the start of the next chunk. Blank chunks are skipped.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+    # False while current holds only overlap carried from the previous chunk
+    has_new_text = False
+
+    def flush() -> Iterator[str]:
+        chunk = "".join(segment for segment, _ in current)
+        if has_new_text and chunk.strip():
+            yield chunk
+
+    for segment in iter_segments(pieces):
+        segment_tokens = count_tokens(segment, model)
+        parts = (
+            [(part, count_tokens(part, model)) for part in _split_by_tokens(segment, max_tokens, model)]
+            if segment_tokens > max_tokens else [(segment, segment_tokens)]
+        )
+
+        for part, part_tokens in parts:
+            if current and current_tokens + part_tokens > max_tokens:
+                yield from flush()
+
+                # Carry the trailing segments that fit in the overlap
+                tail: List[Tuple[str, int]] = []
+                tail_tokens = 0
+                for previous, previous_tokens in reversed(current):
+                    if tail_tokens + previous_tokens > overlap_tokens:
+                        break
+                    tail.insert(0, (previous, previous_tokens))
+                    tail_tokens += previous_tokens
+                current, current_tokens = tail, tail_tokens
+                has_new_text = False
+
+                # Drop overlap from the front if the next part still does not fit
+                while current and current_tokens + part_tokens > max_tokens:
+                    current_tokens -= current.pop(0)[1]
+
+            current.append((part, part_tokens))
+            current_tokens += part_tokens
+            has_new_text = True
+
+    yield from flush()
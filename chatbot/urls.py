@@ -8,5 +8,8 @@ urlpatterns = [
     path('history/', views.ChatHistoryView.as_view(), name='chat_history'),
     path('summarize-note/', views.SummarizeNoteView.as_view(), name='summarize_note'),
     path('summarize-document/', views.DocumentSummarizerView.as_view(), name='summarize_document'),
+    path('summarize-document/batch/', views.DocumentBatchSummarizerView.as_view(), name='summarize_document_batch'),
+    path('summarize-document/jobs/<uuid:job_id>/', views.DocumentSummaryJobView.as_view(), name='document_summary_job'),
+    path('metrics/', views.ChatbotMetricsView.as_view(), name='chatbot_metrics'),
     path('whatsapp/webhook/', WhatsAppWebhookView.as_view(), name='whatsapp_webhook'),
 ]
@@ -1,16 +1,35 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime
-from .ai_functions import chatbot, classifier
+from .ai_functions import chatbot, classifier, classify_batch, classify_batch_llm_calls, get_classifier_batch_stats
 from .note_processor import summarize_note
-from .models import ChatMessage 
-from .serializers import ChatMessageSerializer
+from .models import ArchivedChatMessage, ChatMessage, ChatMessageLink, DocumentSummaryJob
+from .serializers import ArchivedChatMessageSerializer, ChatMessageSerializer, DocumentSummaryJobSerializer
+from .pagination import InvalidCursor, paginate_keyset, parse_limit
+from .chat_turns import build_turn, submit_turn, get_recent_history, pending_history_messages, get_chat_turn_stats
 from actions.models import Event, Task, Note
-from .document_summarizer import summarize_document, summarize_text
-import tempfile
+from .document_summarizer import summarize_combined, summarize_text, summarize_upload
+from .llm_cache import get_cache_stats
+from .document_cache import get_document_cache_stats
+from .image_preprocess import get_image_prep_stats
+from .single_flight import request_fingerprint, run_single_flight, get_single_flight_stats
+from .fast_path import try_fast_path, get_fast_path_stats
+from .metrics import get_counters
+from .llm_router import get_route_stats
+from .llm_instrumentation import llm_concurrency_budget, llm_usage_scope, get_llm_call_stats, worker_call
+from .rate_limit import RateLimited, acquire, release, llm_rate_limit, rate_limited_response, get_rate_limit_stats
 import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 
@@ -29,24 +48,41 @@ class ChatBotView(APIView):
             return Response({"error": "Message too long (max 2000 characters)"}, status=status.HTTP_400_BAD_REQUEST)
 
         user = request.user
+        # Without an Idempotency-Key only retries overlapping the running request are merged
+        idempotency_key = request.headers.get('Idempotency-Key')
+        flight_key = request_fingerprint(user.pk, 'chat', {'message': user_message}, idempotency_key)
+        try:
+            # The rate limiter is taken inside the leader, so coalesced duplicates never pay for it
+            with llm_usage_scope(user):
+                response_data, response_status = run_single_flight(
+                    flight_key,
+                    lambda: self._process_message(user, user_message),
+                    should_store=lambda result: result[1] < 500,
+                    replay=bool(idempotency_key)
+                )
+        except RateLimited as e:
+            return rate_limited_response(e)
+        return Response(response_data, status=response_status)
 
-        history_msgs = ChatMessage.objects.filter(user=user).order_by('-created_at')[:20]
-        history = []
-        for msg in reversed(history_msgs):
-            history.append({
-                'role': msg.role,
-                'timestamp': msg.created_at.isoformat(),
-                'message': msg.content
-            })
-
-        ChatMessage.objects.create(
-            user=user,
-            role='user',
-            content=user_message
-        )
+    def _process_message(self, user, user_message):
+        """Run one chat turn and return (response_data, status_code)."""
+        # Greetings, thanks and "show my tasks today" are answered without the LLM
+        # and without touching the rate limiter
+        fast_result = try_fast_path(user, user_message)
+        if fast_result is not None:
+            return self._run_turn(user, user_message, fast_result)
+
+        with llm_rate_limit(user, 'chat'):
+            return self._run_turn(user, user_message, None)
+
+    def _run_turn(self, user, user_message, fast_result):
+        history = get_recent_history(user) if fast_result is None else []
+
+        # The turn (both messages and their links) is written once, after the reply
+        user_created_at = timezone.now()
 
         try:
-            result = chatbot(history, user_message)
+            result = fast_result or chatbot(history, user_message)
             
             # Validate and extract response data with defaults
             response_type = result.get('response_type', 'response')
@@ -92,17 +128,27 @@ class ChatBotView(APIView):
             creation_error = None
 
             if response_type == 'multiple':
-                # Create every item the AI returned and collect their IDs
-                item_ids = []
+                # Build every item the AI returned, then save them all in one transaction
+                built_items = []
                 for sub_item in result.get('items', []):
                     try:
-                        sub_id = self._create_structured_data(user, sub_item)
-                        if sub_id:
-                            item_ids.append({'type': sub_item.get('response_type'), 'id': sub_id})
+                        built = self._build_structured_item(user, sub_item)
+                        if built:
+                            built_items.append(built)
                     except Exception as sub_e:
                         import traceback
-                        print(f"⚠️ Failed to create sub-item {sub_item.get('response_type')}: {sub_e}")
+                        print(f"⚠️ Failed to build sub-item {sub_item.get('response_type')}: {sub_e}")
                         print(traceback.format_exc())
+                try:
+                    item_ids = [
+                        {'type': item_type, 'id': item_id}
+                        for item_type, item_id in self._save_structured_items(user, built_items)
+                    ]
+                except Exception as e:
+                    import traceback
+                    item_ids = []
+                    print(f"⚠️ Failed to save {len(built_items)} items: {e}")
+                    print(traceback.format_exc())
                 if item_ids:
                     created_item_id = item_ids
             else:
@@ -121,13 +167,27 @@ class ChatBotView(APIView):
                 else:
                     chat_msg_data['metadata']['item_id'] = created_item_id
 
-            chat_msg = ChatMessage.objects.create(**chat_msg_data)
+            if isinstance(created_item_id, list):
+                item_links = created_item_id
+            elif created_item_id:
+                item_links = [{'type': response_type, 'id': created_item_id}]
+            else:
+                item_links = []
+
+            turn = build_turn(
+                user, user_message, user_created_at,
+                assistant={key: chat_msg_data[key] for key in ('content', 'response_type', 'metadata')},
+                item_links=item_links
+            )
+            chat_msg = submit_turn(turn)
 
-            # Return backward-compatible response with additional rich fields
+            # Return backward-compatible response with additional rich fields;
+            # message_id is None when the write was deferred to the queue
             response_data = {
                 'message': content,
                 'response_type': response_type,
-                'message_id': str(chat_msg.id)
+                'message_id': str(chat_msg.id) if chat_msg else None,
+                'turn_id': turn['turn_id']
             }
 
             # Include the created item id(s) so the frontend can use edit/delete APIs
@@ -163,24 +223,38 @@ class ChatBotView(APIView):
             if result.get('reminders'):
                 response_data['reminders'] = result['reminders']
 
-            return Response(response_data, status=status.HTTP_200_OK)
+            return response_data, status.HTTP_200_OK
 
         except Exception as e:
             print(f"⚠️ Chatbot processing error: {str(e)}")
-            return Response({
+            try:
+                submit_turn(build_turn(user, user_message, user_created_at))
+            except Exception as save_e:
+                print(f"⚠️ Failed to save user message: {save_e}")
+            return {
                 'error': 'Chatbot processing failed',
                 'details': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR
         
 
         
 
     def _create_structured_data(self, user, result):
         """Extract and save structured data from enhanced chatbot response"""
+        built = self._build_structured_item(user, result)
+        if not built:
+            return None
+        return self._save_structured_items(user, [built])[0][1]
+
+    def _build_structured_item(self, user, result):
+        """
+        Build the unsaved Event/Task/Note for one chatbot result.
+
+        Returns (response_type, obj, reminders) with unsaved Reminder rows, or None
+        when the result is not a structured item.
+        """
         from datetime import datetime, timedelta
         from .timezone_utils import parse_iso8601_to_datetime
-        from actions.models import Reminder
-        from django.contrib.contenttypes.models import ContentType
         
         response_type = result.get('response_type')
         
@@ -202,8 +276,8 @@ class ChatBotView(APIView):
                     event_datetime = datetime.combine(parsed_date, datetime.min.time())
                     event_datetime = timezone.make_aware(event_datetime)
             
-            # Create event with all available data
-            event = Event.objects.create(
+            # Event with all available data
+            event = Event(
                 user=user,
                 title=result.get('title', result.get('content', ''))[:255],
                 description=result.get('description', result.get('content', '')),
@@ -211,11 +285,12 @@ class ChatBotView(APIView):
                 event_datetime=event_datetime
             )
 
-            # Create reminders if present
+            # Reminders if present
+            reminders = []
             if event_datetime and result.get('reminders'):
-                self._create_reminders(event, result['reminders'], event_datetime)
+                reminders = self._build_reminders(event, result['reminders'], event_datetime)
 
-            return str(event.id)
+            return 'event', event, reminders
         
         elif response_type == 'task':
             # Try ISO-8601 format first
@@ -249,8 +324,8 @@ class ChatBotView(APIView):
                         start_time = datetime.combine(tomorrow_date, parsed_time)
                         start_time = timezone.make_aware(start_time)
             
-            # Create task with all available data
-            task = Task.objects.create(
+            # Task with all available data
+            task = Task(
                 user=user,
                 title=result.get('title', result.get('content', ''))[:255],
                 description=result.get('description', result.get('content', '')),
@@ -260,14 +335,15 @@ class ChatBotView(APIView):
                 completed=False
             )
 
-            # Create reminders if present and we have a start_time
+            # Reminders if present and we have a start_time
+            reminders = []
             if start_time and result.get('reminders'):
-                self._create_reminders(task, result['reminders'], start_time)
+                reminders = self._build_reminders(task, result['reminders'], start_time)
 
-            return str(task.id)
+            return 'task', task, reminders
         
         elif response_type == 'note':
-            note = Note.objects.create(
+            note = Note(
                 user=user,
                 title=result.get('title', '')[:255],
                 original=result.get('note_content', result.get('content', '')),
@@ -275,15 +351,18 @@ class ChatBotView(APIView):
                 points=[]
             )
 
-            return str(note.id)
+            return 'note', note, []
 
-    def _create_reminders(self, obj, reminders_data, scheduled_time):
-        """Create reminder objects for an event or task"""
+        return None
+
+    def _build_reminders(self, obj, reminders_data, scheduled_time):
+        """Unsaved reminder objects for an event or task"""
         from datetime import timedelta
         from actions.models import Reminder
         from django.contrib.contenttypes.models import ContentType
         
         content_type = ContentType.objects.get_for_model(obj)
+        reminders = []
         
         for reminder_data in reminders_data:
             time_before = reminder_data.get('time_before', 30)  # minutes
@@ -294,14 +373,40 @@ class ChatBotView(APIView):
             
             # Only create if reminder time is in the future
             if reminder_time > timezone.now():
-                Reminder.objects.create(
+                reminders.append(Reminder(
                     content_type=content_type,
                     object_id=obj.id,
                     time_before=time_before,
                     types=reminder_types,
                     scheduled_time=reminder_time,
                     sent=False
-                )
+                ))
+
+        return reminders
+
+    def _save_structured_items(self, user, built_items):
+        """
+        Save built (response_type, obj, reminders) items in one transaction:
+        one bulk_create per model and one for all reminders.
+        Returns [(response_type, id)] in input order.
+        """
+        from django.db import transaction
+        from actions.models import Reminder
+
+        if not built_items:
+            return []
+
+        with transaction.atomic():
+            for model in (Event, Task, Note):
+                objs = [obj for _, obj, _ in built_items if isinstance(obj, model)]
+                if objs:
+                    model.objects.bulk_create(objs)
+
+            reminders = [reminder for _, _, item_reminders in built_items for reminder in item_reminders]
+            if reminders:
+                Reminder.objects.bulk_create(reminders)
+
+        return [(item_type, str(obj.id)) for item_type, obj, _ in built_items]
 
     
     def _parse_date_field(self, date_str):
@@ -363,14 +468,56 @@ class ChatBotView(APIView):
 class ClassifyMessageView(APIView):
 
     def post(self, request):
+        if "messages" in request.data:
+            return self._classify_batch(request)
+
         message = request.data.get("message", "").strip()
         if not message:
             return Response({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            result = classifier([], message)
+            with llm_rate_limit(request.user, 'classify'), llm_usage_scope(request.user):
+                result = classifier([], message)
             return Response(result, status=status.HTTP_200_OK)
         
+        except RateLimited as e:
+            return rate_limited_response(e)
+        except Exception as e:
+            return Response({
+                'error': 'Classification failed',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _classify_batch(self, request):
+        messages = request.data.get("messages")
+        max_items = getattr(settings, "CLASSIFY_BATCH_MAX_ITEMS", 500)
+
+        if not isinstance(messages, list) or not messages:
+            return Response({"error": "messages must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(messages) > max_items:
+            return Response({"error": f"Too many messages (max {max_items})"}, status=status.HTTP_400_BAD_REQUEST)
+
+        cleaned = []
+        for index, message in enumerate(messages):
+            if not isinstance(message, str) or not message.strip():
+                return Response({"error": f"messages[{index}] must be a non-empty string"}, status=status.HTTP_400_BAD_REQUEST)
+            if len(message) > 2000:
+                return Response({"error": f"messages[{index}] too long (max 2000 characters)"}, status=status.HTTP_400_BAD_REQUEST)
+            cleaned.append(message.strip())
+
+        # One token per LLM call the batch can make: packed calls plus capped fallbacks
+        cost = classify_batch_llm_calls(len(cleaned))
+
+        try:
+            with llm_rate_limit(request.user, 'classify', cost=cost), llm_usage_scope(request.user):
+                results = classify_batch(cleaned)
+            return Response({
+                'results': [{'index': index, **result} for index, result in enumerate(results)],
+                'count': len(results)
+            }, status=status.HTTP_200_OK)
+        
+        except RateLimited as e:
+            return rate_limited_response(e)
         except Exception as e:
             return Response({
                 'error': 'Classification failed',
@@ -381,71 +528,133 @@ class ClassifyMessageView(APIView):
 
 class ChatHistoryView(APIView):
 
-    def _enrich_metadata(self, message_data):
+    # Latest fields of each linked item type, overlaid on the stored metadata
+    ENRICHED_FIELDS = {
+        'event': lambda obj: {
+            'title': obj.title,
+            'description': obj.description or '',
+            'location_address': obj.location_address or '',
+            'event_datetime': obj.event_datetime.isoformat() if obj.event_datetime else None,
+        },
+        'task': lambda obj: {
+            'title': obj.title,
+            'description': obj.description or '',
+            'start_time': obj.start_time.isoformat() if obj.start_time else None,
+            'end_time': obj.end_time.isoformat() if obj.end_time else None,
+            'tags': obj.tags,
+            'completed': obj.completed,
+        },
+        'note': lambda obj: {
+            'title': obj.title or '',
+            'note_content': obj.original,
+        },
+    }
+
+    def _enrich_messages(self, user, messages, messages_data):
         """
-        If the message has an item_id in its metadata, fetch the latest
-        fields from the actual Event / Task / Note and overlay them so the
-        history always reflects the current state of the linked item.
+        For event/task/note messages, overlay the latest fields from the
+        linked Event / Task / Note so the history always reflects the current
+        state of the item. Links come from one ChatMessageLink query for the
+        page and items from one in_bulk query per type.
         """
-        metadata = message_data.get('metadata') or {}
-        item_id = metadata.get('item_id')
-        response_type = message_data.get('response_type')
-
-        if not item_id or response_type not in ('event', 'task', 'note'):
-            return message_data
+        from django.contrib.contenttypes.models import ContentType
+        models_by_type = {'event': Event, 'task': Task, 'note': Note}
+        enriched_ids = [
+            message.pk for message in messages if message.response_type in models_by_type
+        ]
+        if not enriched_ids:
+            return messages_data
 
         try:
-            if response_type == 'event':
-                from actions.models import Event
-                obj = Event.objects.filter(pk=item_id).first()
-                if obj:
-                    metadata.update({
-                        'title': obj.title,
-                        'description': obj.description or '',
-                        'location_address': obj.location_address or '',
-                        'event_datetime': obj.event_datetime.isoformat() if obj.event_datetime else None,
-                    })
-
-            elif response_type == 'task':
-                from actions.models import Task
-                obj = Task.objects.filter(pk=item_id).first()
-                if obj:
-                    metadata.update({
-                        'title': obj.title,
-                        'description': obj.description or '',
-                        'start_time': obj.start_time.isoformat() if obj.start_time else None,
-                        'end_time': obj.end_time.isoformat() if obj.end_time else None,
-                        'tags': obj.tags,
-                        'completed': obj.completed,
-                    })
-
-            elif response_type == 'note':
-                from actions.models import Note
-                obj = Note.objects.filter(pk=item_id).first()
-                if obj:
-                    metadata.update({
-                        'title': obj.title or '',
-                        'note_content': obj.original,
-                    })
-
-            # Remove keys whose value is None to keep the response clean
-            metadata = {k: v for k, v in metadata.items() if v is not None}
-            message_data['metadata'] = metadata
+            links = ChatMessageLink.objects.filter(message_id__in=enriched_ids)
+            content_type_ids = {
+                ContentType.objects.get_for_model(model).pk: response_type
+                for response_type, model in models_by_type.items()
+            }
 
+            link_by_message = {}
+            ids_by_type = {response_type: set() for response_type in models_by_type}
+            for message_id, content_type_id, object_id in links.values_list('message_id', 'content_type_id', 'object_id'):
+                response_type = content_type_ids.get(content_type_id)
+                if response_type:
+                    link_by_message[(message_id, response_type)] = object_id
+                    ids_by_type[response_type].add(object_id)
+
+            objects_by_type = {
+                response_type: models_by_type[response_type].objects.filter(user=user).in_bulk(ids)
+                for response_type, ids in ids_by_type.items() if ids
+            }
         except Exception as e:
             print(f"⚠️ Failed to enrich chat history metadata: {e}")
+            return messages_data
 
-        return message_data
+        for message, message_data in zip(messages, messages_data):
+            object_id = link_by_message.get((message.pk, message.response_type))
+            obj = objects_by_type.get(message.response_type, {}).get(object_id)
+            if obj is None:
+                continue
+
+            metadata = message_data.get('metadata') or {}
+            metadata.update(self.ENRICHED_FIELDS[message.response_type](obj))
+            # Remove keys whose value is None to keep the response clean
+            message_data['metadata'] = {k: v for k, v in metadata.items() if v is not None}
+
+        return messages_data
 
     def get(self, request):
-        messages = ChatMessage.objects.filter(user=request.user).order_by('created_at')
+        """
+        One page of history, oldest first. Without a cursor the newest page is
+        returned; pass ?before=<older_cursor> to load older messages or
+        ?after=<newer_cursor> for newer ones, with an optional ?limit.
+        ?archived=true pages through messages moved to the archive instead.
+        """
+        if request.query_params.get('archived', '').lower() in ('1', 'true', 'yes'):
+            return self._get_archived(request)
+
+        try:
+            messages, page = paginate_keyset(
+                ChatMessage.objects.filter(user=request.user),
+                parse_limit(request.query_params.get('limit')),
+                before=request.query_params.get('before'),
+                after=request.query_params.get('after')
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         serializer = ChatMessageSerializer(messages, many=True)
+        enriched = self._enrich_messages(request.user, messages, serializer.data)
 
-        enriched = [self._enrich_metadata(msg) for msg in serializer.data]
+        # Read-your-writes: turns still queued for the write-behind worker
+        if not page['has_newer']:
+            persisted_turns = {
+                (message.metadata or {}).get('turn_id') for message in messages if message.role == 'assistant'
+            }
+            pending = pending_history_messages(request.user.pk, exclude_turn_ids=persisted_turns)
+            enriched = list(enriched) + pending
 
         return Response({
             'messages': enriched,
-            'total_count': messages.count()
+            'count': len(enriched),
+            **page
+        }, status=status.HTTP_200_OK)
+
+    def _get_archived(self, request):
+        try:
+            messages, page = paginate_keyset(
+                ArchivedChatMessage.objects.filter(user=request.user),
+                parse_limit(request.query_params.get('limit')),
+                before=request.query_params.get('before'),
+                after=request.query_params.get('after')
+            )
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ArchivedChatMessageSerializer(messages, many=True)
+        return Response({
+            'messages': serializer.data,
+            'count': len(messages),
+            'archived': True,
+            **page
         }, status=status.HTTP_200_OK)
 
 
@@ -462,22 +671,44 @@ class SummarizeNoteView(APIView):
                 "error": "Note content is required"
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        idempotency_key = request.headers.get('Idempotency-Key')
+        flight_key = request_fingerprint(
+            request.user.pk, 'summarize_note', {'note': raw_note, 'max_length': max_length}, idempotency_key
+        )
+        try:
+            with llm_usage_scope(request.user):
+                response_data, response_status = run_single_flight(
+                    flight_key,
+                    lambda: self._summarize(request.user, raw_note, max_length),
+                    should_store=lambda result: result[1] < 500,
+                    replay=bool(idempotency_key)
+                )
+        except RateLimited as e:
+            return rate_limited_response(e)
+        return Response(response_data, status=response_status)
+
+    def _summarize(self, user, raw_note, max_length):
+        # Only the single-flight leader takes a rate/concurrency slot
+        with llm_rate_limit(user, 'summarize_note'):
+            return self._run_summary(raw_note, max_length)
+
+    def _run_summary(self, raw_note, max_length):
         try:
             # Use summarize_text with appropriate max_length
             result = summarize_text(raw_note, max_length)
             
-            return Response({
+            return {
                 "summary": result["summary"],
                 "original_note": raw_note,
                 "original_length": result["original_length"],
                 "summary_length": result["summary_length"]
-            }, status=status.HTTP_200_OK)
+            }, status.HTTP_200_OK
             
         except Exception as e:
-            return Response({
+            return {
                 "error": "Failed to summarize note",
                 "details": str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
 
@@ -485,21 +716,35 @@ class SummarizeNoteView(APIView):
 class DocumentSummarizerView(APIView):
 
     def post(self, request):
+        try:
+            max_length = int(request.data.get('max_length', 500))
+        except (TypeError, ValueError):
+            return Response({
+                "error": "max_length must be a number"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'file' in request.FILES and self._wants_job(request):
+            # The worker takes the 'document' rate/concurrency slot when it runs the job
+            return self._submit_job(
+                request, request.FILES['file'], max_length, request.data.get('custom_prompt', None)
+            )
+
+        try:
+            with llm_rate_limit(request.user, 'document'):
+                return self._summarize(request, max_length)
+        except RateLimited as e:
+            return rate_limited_response(e)
+
+    def _summarize(self, request, max_length):
 
         if 'file' in request.FILES:
             uploaded_file = request.FILES['file']
-            max_length = int(request.data.get('max_length', 500))
             custom_prompt = request.data.get('custom_prompt', None)
             
             try:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-                    for chunk in uploaded_file.chunks():
-                        tmp_file.write(chunk)
-                    tmp_file_path = tmp_file.name
-                
-                result = summarize_document(tmp_file_path, max_length, custom_prompt)
-
-                os.unlink(tmp_file_path)
+                # Read in place: Django already spooled large uploads to a temp file
+                with llm_usage_scope(request.user):
+                    result = summarize_upload(uploaded_file, max_length, custom_prompt)
                 
                 return Response({
                     "success": True,
@@ -509,10 +754,6 @@ class DocumentSummarizerView(APIView):
                 }, status=status.HTTP_200_OK)
                 
             except Exception as e:
-
-                if 'tmp_file_path' in locals() and os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
-                
                 return Response({
                     "error": "Failed to summarize document",
                     "details": str(e)
@@ -520,7 +761,6 @@ class DocumentSummarizerView(APIView):
         
         elif 'text' in request.data:
             text = request.data.get('text', '').strip()
-            max_length = int(request.data.get('max_length', 500))
             custom_prompt = request.data.get('custom_prompt', None)
             
             if not text:
@@ -529,7 +769,8 @@ class DocumentSummarizerView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             try:
-                result = summarize_text(text, max_length, custom_prompt)
+                with llm_usage_scope(request.user):
+                    result = summarize_text(text, max_length, custom_prompt)
                 
                 return Response({
                     "success": True,
@@ -547,4 +788,221 @@ class DocumentSummarizerView(APIView):
         else:
             return Response({
                 "error": "Either 'file' or 'text' parameter is required"
-            }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def _wants_job(self, request):
+        value = request.data.get('async', getattr(settings, 'DOCUMENT_JOBS_ASYNC_DEFAULT', False))
+        return str(value).lower() in ('1', 'true', 'yes')
+
+    def _submit_job(self, request, uploaded_file, max_length, custom_prompt):
+        """Store the upload for the worker and queue a DocumentSummaryJob; responds 202 with its id."""
+        from .tasks import run_document_summary_job
+
+        upload_dir = settings.DOCUMENT_JOB_UPLOAD_DIR
+        extension = os.path.splitext(uploaded_file.name)[1]
+        job = DocumentSummaryJob(
+            user=request.user,
+            file_name=uploaded_file.name[:255],
+            file_size=uploaded_file.size or 0,
+            max_length=max_length,
+            custom_prompt=custom_prompt
+        )
+        # The summarizer picks its extractor from the suffix; keep only plain extensions
+        job.upload_path = os.path.join(upload_dir, f"{job.id}{extension if extension[1:].isalnum() else ''}")
+
+        try:
+            os.makedirs(upload_dir, exist_ok=True)
+            if hasattr(uploaded_file, 'temporary_file_path'):
+                # Large upload already on disk: rename it instead of copying
+                file_move_safe(uploaded_file.temporary_file_path(), job.upload_path)
+            else:
+                with open(job.upload_path, 'wb') as f:
+                    for chunk in uploaded_file.chunks():
+                        f.write(chunk)
+            with transaction.atomic():
+                job.save()
+                transaction.on_commit(lambda: run_document_summary_job.delay(str(job.id)))
+        except Exception as e:
+            if os.path.exists(job.upload_path):
+                os.unlink(job.upload_path)
+            DocumentSummaryJob.objects.filter(id=job.id).update(status='failed', error=str(e), upload_path='')
+            return Response({
+                "error": "Failed to queue document summary",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({
+            "success": True,
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse('document_summary_job', args=[job.id]))
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+
+
+class DocumentBatchSummarizerView(APIView):
+    """
+    Summarize several uploaded files ('files') in one request.
+
+    Files are processed in parallel and all their LLM calls share one
+    concurrency budget. Results stream back as NDJSON: one "file" line per
+    file as it finishes, an optional "combined" cross-document summary
+    (combine=true), then a "done" line.
+    """
+
+    def post(self, request):
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({
+                "error": "At least one file is required in 'files'"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_files = getattr(settings, 'DOCUMENT_BATCH_MAX_FILES', 20)
+        if len(files) > max_files:
+            return Response({
+                "error": f"At most {max_files} files can be summarized at once"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            max_length = int(request.data.get('max_length', 500))
+        except (TypeError, ValueError):
+            return Response({
+                "error": "max_length must be a number"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        custom_prompt = request.data.get('custom_prompt') or None
+        combine = str(request.data.get('combine', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            # Held until the stream finishes, not just until this method returns
+            holder = acquire(request.user, 'document', cost=len(files))
+        except RateLimited as e:
+            return rate_limited_response(e)
+
+        response = StreamingHttpResponse(
+            self._results(request.user, files, max_length, custom_prompt, combine, holder),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _results(self, user, files, max_length, custom_prompt, combine, holder):
+        summaries = {}
+        pool = ThreadPoolExecutor(max_workers=min(len(files), max(1, getattr(settings, 'DOCUMENT_BATCH_CONCURRENCY', 4))))
+        try:
+            with llm_usage_scope(user), llm_concurrency_budget(getattr(settings, 'DOCUMENT_BATCH_LLM_CONCURRENCY', 6)):
+                # worker_call() carries the user and the shared LLM budget into the workers
+                futures = {
+                    pool.submit(worker_call(summarize_upload), uploaded_file, max_length, custom_prompt): index
+                    for index, uploaded_file in enumerate(files)
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        summaries[index] = future.result()
+                        line = {"type": "file", "index": index, "success": True, **summaries[index]}
+                    except Exception as e:
+                        line = {
+                            "type": "file",
+                            "index": index,
+                            "success": False,
+                            "file_name": files[index].name,
+                            "error": "Failed to summarize document",
+                            "details": str(e)
+                        }
+                    yield json.dumps(line) + "\n"
+
+                if combine and len(summaries) > 1:
+                    try:
+                        combined = summarize_combined(
+                            [(summaries[index]["file_name"], summaries[index]["summary"]) for index in sorted(summaries)],
+                            max_length, custom_prompt
+                        )
+                        line = {"type": "combined", "success": True, "summary": combined}
+                    except Exception as e:
+                        line = {"type": "combined", "success": False, "error": "Failed to combine summaries", "details": str(e)}
+                    yield json.dumps(line) + "\n"
+
+            yield json.dumps({
+                "type": "done",
+                "count": len(files),
+                "succeeded": len(summaries),
+                "failed": len(files) - len(summaries)
+            }) + "\n"
+        finally:
+            # Also reached when the client disconnects: skip files not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
+            release(user, holder)
+
+
+
+
+class DocumentSummaryJobView(APIView):
+    """
+    Status and result of a background document summary.
+
+    ?stream=true answers with server-sent events instead: a "progress" event
+    whenever the job changes, until it completes or fails. The stream holds a
+    server worker while it is open, so it is only served when
+    DOCUMENT_JOB_SSE_ENABLED is set (meant for async/gevent deployments) and
+    is capped at DOCUMENT_JOB_SSE_TIMEOUT seconds; otherwise clients get the
+    plain status and poll.
+    """
+
+    def get(self, request, job_id):
+        try:
+            job = DocumentSummaryJob.objects.get(id=job_id, user=request.user)
+        except DocumentSummaryJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        wants_stream = str(request.query_params.get('stream', '')).lower() in ('1', 'true', 'yes')
+        if wants_stream and getattr(settings, 'DOCUMENT_JOB_SSE_ENABLED', False):
+            response = StreamingHttpResponse(self._events(job), content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            # Stop nginx from buffering the stream
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        return Response(DocumentSummaryJobSerializer(job).data, status=status.HTTP_200_OK)
+
+    def _events(self, job):
+        poll_interval = getattr(settings, 'DOCUMENT_JOB_SSE_POLL_INTERVAL', 1.0)
+        deadline = time.monotonic() + getattr(settings, 'DOCUMENT_JOB_SSE_TIMEOUT', 60)
+        last = None
+        while True:
+            data = DocumentSummaryJobSerializer(job).data
+            if data != last:
+                yield f"event: progress\ndata: {json.dumps(data, default=str)}\n\n"
+                last = data
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+
+            if job.is_finished:
+                return
+            if time.monotonic() >= deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            time.sleep(poll_interval)
+            job.refresh_from_db()
+
+
+
+
+class ChatbotMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'llm_cache': get_cache_stats(),
+            'single_flight': get_single_flight_stats(),
+            'fast_path': get_fast_path_stats(),
+            'chatbot_output': get_counters('chatbot_output', ['structured', 'structured_fallback', 'json_repair']),
+            'classifier_batch': get_classifier_batch_stats(),
+            'chat_turns': get_chat_turn_stats(),
+            'llm_rate_limit': get_rate_limit_stats(),
+            'document_cache': get_document_cache_stats(),
+            'image_prep': get_image_prep_stats(),
+            'llm_routes': get_route_stats(),
+            'llm_calls': get_llm_call_stats()
+        }, status=status.HTTP_200_OK)
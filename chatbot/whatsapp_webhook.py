@@ -16,6 +16,10 @@ from authentication.models import UserAccount
 from actions.models import Event, Task, Note, Reminder
 from django.contrib.contenttypes.models import ContentType
 from .ai_functions import classifier
+from .llm_router import run_routed
+from .llm_backends import get_chat_model
+from .llm_instrumentation import invoke_llm, record_parse_failure, llm_usage_scope
+from .rate_limit import RateLimited, llm_rate_limit
 from .timezone_utils import parse_iso8601_to_datetime
 from django.http import HttpResponse
 
@@ -27,18 +31,11 @@ def whatsapp_chatbot(message: str) -> dict:
     WhatsApp-specific chatbot that provides conversational responses
     and validates required fields before creating entries.
     """
-    from langchain_openai import ChatOpenAI
     from langchain_core.messages import HumanMessage, SystemMessage
     import json
     
     api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY'))
     
-    llm = ChatOpenAI(
-        model="gpt-4",
-        temperature=0.7,
-        openai_api_key=api_key
-    )
-    
     current_date = datetime.now().strftime("%Y-%m-%d")
     current_time = datetime.now().strftime("%H:%M")
     
@@ -119,26 +116,35 @@ Response: {{"type": "reminder_confirmation", "response": "Perfect! I'll remind y
         HumanMessage(content=message)
     ]
     
-    response = llm.invoke(messages)
-    
-    try:
-        result = json.loads(response.content.strip())
-        
-        if isinstance(result, list):
-            result = result[0] if result else {}
-        
-        if not isinstance(result, dict):
-            raise ValueError("Invalid response format")
-        
-        return result
-        
-    except (json.JSONDecodeError, ValueError) as e:
-        logger.error(f"WhatsApp chatbot parsing error: {e}")
+    def attempt(model, is_last):
+        llm = get_chat_model("whatsapp_chatbot", model, temperature=0.7, api_key=api_key)
+        response = invoke_llm("whatsapp_chatbot", llm, messages)
+
+        try:
+            result = json.loads(response.content.strip())
+            
+            if isinstance(result, list):
+                result = result[0] if result else {}
+            
+            if not isinstance(result, dict):
+                raise ValueError("Invalid response format")
+            
+            return result
+            
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"WhatsApp chatbot parsing error ({model}): {e}")
+            record_parse_failure("whatsapp_chatbot", model)
+            return None
+
+    # Escalate to the next model tier when the reply is not valid JSON
+    result = run_routed("whatsapp_chatbot", attempt, accept=lambda result: result is not None)
+    if result is None:
         return {
             "type": "response",
             "response": "I had trouble understanding that. Could you try rephrasing?",
             "ready": True
         }
+    return result
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -241,7 +247,8 @@ class WhatsAppWebhookView(APIView):
         # Process message with AI
         try:
             print("Processing with AI...")
-            result = whatsapp_chatbot(message_body)
+            with llm_rate_limit(user, 'whatsapp'), llm_usage_scope(user):
+                result = whatsapp_chatbot(message_body)
             print(f"AI Result: {result}")
             
             response_type = result.get('type', 'response')
@@ -260,6 +267,13 @@ class WhatsAppWebhookView(APIView):
             print(f"Sending response: {ai_response}")
             return self._send_twilio_response(ai_response)
             
+        except RateLimited as e:
+            print(f"Rate limited: {e}")
+            return self._send_twilio_response(
+                f"You're sending messages faster than I can keep up 😅 "
+                f"Please wait about {e.retry_after} seconds and try again."
+            )
+            
         except Exception as e:
             print(f"ERROR: {str(e)}")
             import traceback
@@ -192,6 +192,130 @@ CACHES = {
 }
 
 
+# LLM response cache (classifier / summarizers)
+LLM_CACHE_ENABLED = env.bool('LLM_CACHE_ENABLED', default=True)
+LLM_CACHE_TTL = env.int('LLM_CACHE_TTL', default=60 * 60 * 24)
+LLM_CACHE_MAX_ENTRIES = env.int('LLM_CACHE_MAX_ENTRIES', default=10000)
+LLM_CACHE_MAX_VALUE_BYTES = env.int('LLM_CACHE_MAX_VALUE_BYTES', default=64 * 1024)
+
+# Coalescing of duplicate in-flight chat/summarize requests (seconds)
+SINGLE_FLIGHT_LOCK_TIMEOUT = env.int('SINGLE_FLIGHT_LOCK_TIMEOUT', default=120)
+SINGLE_FLIGHT_WAIT_TIMEOUT = env.int('SINGLE_FLIGHT_WAIT_TIMEOUT', default=90)
+# How long a finished result is kept for waiting followers and Idempotency-Key retries
+SINGLE_FLIGHT_RESULT_TTL = env.int('SINGLE_FLIGHT_RESULT_TTL', default=30)
+
+# Use tool-calling structured output for chatbot() (free-form JSON parsing stays as fallback)
+CHATBOT_STRUCTURED_OUTPUT = env.bool('CHATBOT_STRUCTURED_OUTPUT', default=True)
+
+# Model tiers per LLM route, cheapest first; a call escalates to the next tier on
+# schema failure or when the classifier confidence is below LLM_ESCALATION_CONFIDENCE
+LLM_MODEL_TIERS = {
+    'chatbot': ['gpt-4o-mini', 'gpt-4'],
+    'classifier': ['gpt-4o-mini', 'gpt-4'],
+    'classifier_batch': ['gpt-4o-mini', 'gpt-4'],
+    'summarize_note': ['gpt-4o-mini', 'gpt-4'],
+    'summarize_text': ['gpt-4o-mini', 'gpt-4'],
+    'whatsapp_chatbot': ['gpt-4o-mini', 'gpt-4'],
+}
+LLM_ESCALATION_CONFIDENCE = env.float('LLM_ESCALATION_CONFIDENCE', default=0.7)
+
+# Batch classification: inputs packed per LLM call, concurrent calls, and max inputs per request
+CLASSIFIER_BATCH_SIZE = env.int('CLASSIFIER_BATCH_SIZE', default=20)
+CLASSIFIER_BATCH_CONCURRENCY = env.int('CLASSIFIER_BATCH_CONCURRENCY', default=4)
+# Per-item classifier() re-runs allowed per batch for items missing from or unsure in a batch reply
+CLASSIFIER_BATCH_MAX_FALLBACKS = env.int('CLASSIFIER_BATCH_MAX_FALLBACKS', default=5)
+CLASSIFY_BATCH_MAX_ITEMS = env.int('CLASSIFY_BATCH_MAX_ITEMS', default=500)
+
+# Chat history page size (cursor pagination)
+CHAT_HISTORY_PAGE_SIZE = env.int('CHAT_HISTORY_PAGE_SIZE', default=50)
+CHAT_HISTORY_MAX_PAGE_SIZE = env.int('CHAT_HISTORY_MAX_PAGE_SIZE', default=200)
+
+# Chat turns are written in one batch after the reply; with CHAT_WRITE_BEHIND_ASYNC the
+# write goes to Celery and the turn stays readable from the cache until it is committed
+CHAT_WRITE_BEHIND_ASYNC = env.bool('CHAT_WRITE_BEHIND_ASYNC', default=False)
+CHAT_PENDING_TURN_TTL = env.int('CHAT_PENDING_TURN_TTL', default=600)
+# Recent messages sent to the chatbot as context, cached per user
+CHAT_CONTEXT_MESSAGES = env.int('CHAT_CONTEXT_MESSAGES', default=20)
+CHAT_CONTEXT_CACHE_TTL = env.int('CHAT_CONTEXT_CACHE_TTL', default=600)
+
+# Chat messages older than this move to the compressed archive table
+CHAT_RETENTION_DAYS = env.int('CHAT_RETENTION_DAYS', default=90)
+CHAT_ARCHIVE_BATCH_SIZE = env.int('CHAT_ARCHIVE_BATCH_SIZE', default=1000)
+CHAT_ARCHIVE_MAX_BATCHES = env.int('CHAT_ARCHIVE_MAX_BATCHES', default=50)
+
+# Concurrent chunk summaries per document
+DOCUMENT_SUMMARY_CONCURRENCY = env.int('DOCUMENT_SUMMARY_CONCURRENCY', default=4)
+# Document chunks in model tokens (GPT-4 has an 8k context), with overlap between chunks
+DOCUMENT_CHUNK_TOKENS = env.int('DOCUMENT_CHUNK_TOKENS', default=6000)
+DOCUMENT_CHUNK_OVERLAP_TOKENS = env.int('DOCUMENT_CHUNK_OVERLAP_TOKENS', default=200)
+# Summaries combined per reduce call when they do not fit in one final prompt
+DOCUMENT_REDUCE_FANOUT = env.int('DOCUMENT_REDUCE_FANOUT', default=8)
+# PDFs with at least DOCUMENT_PDF_PARALLEL_MIN_PAGES pages are extracted in page ranges by one shared pool of DOCUMENT_PDF_WORKERS processes
+DOCUMENT_PDF_WORKERS = env.int('DOCUMENT_PDF_WORKERS', default=4)
+DOCUMENT_PDF_PAGES_PER_TASK = env.int('DOCUMENT_PDF_PAGES_PER_TASK', default=8)
+DOCUMENT_PDF_PARALLEL_MIN_PAGES = env.int('DOCUMENT_PDF_PARALLEL_MIN_PAGES', default=16)
+# Recordings of at least AUDIO_SPLIT_MIN_BYTES are cut at silences (needs ffmpeg) into segments
+# of at most AUDIO_SEGMENT_SECONDS, transcribed AUDIO_TRANSCRIBE_CONCURRENCY at a time
+AUDIO_SPLIT_MIN_BYTES = env.int('AUDIO_SPLIT_MIN_BYTES', default=4 * 1024 * 1024)
+AUDIO_SEGMENT_SECONDS = env.int('AUDIO_SEGMENT_SECONDS', default=600)
+AUDIO_SEGMENT_BITRATE = env('AUDIO_SEGMENT_BITRATE', default='48k')
+AUDIO_SILENCE_THRESHOLD_DB = env.int('AUDIO_SILENCE_THRESHOLD_DB', default=-35)
+AUDIO_MIN_SILENCE_SECONDS = env.float('AUDIO_MIN_SILENCE_SECONDS', default=0.5)
+AUDIO_TRANSCRIBE_CONCURRENCY = env.int('AUDIO_TRANSCRIBE_CONCURRENCY', default=4)
+AUDIO_FFMPEG_TIMEOUT = env.int('AUDIO_FFMPEG_TIMEOUT', default=600)
+# Images are fitted to the Vision model's resolution (long side, short side) and re-encoded before upload
+VISION_IMAGE_MAX_SIDE = env.int('VISION_IMAGE_MAX_SIDE', default=2048)
+VISION_IMAGE_SHORT_SIDE = env.int('VISION_IMAGE_SHORT_SIDE', default=768)
+VISION_IMAGE_QUALITY = env.int('VISION_IMAGE_QUALITY', default=85)
+# Extracted document text/transcripts cached by file SHA-256; larger (compressed) texts are not cached
+DOCUMENT_CACHE_ENABLED = env.bool('DOCUMENT_CACHE_ENABLED', default=True)
+DOCUMENT_CACHE_TTL = env.int('DOCUMENT_CACHE_TTL', default=60 * 60 * 24 * 7)
+DOCUMENT_CACHE_MAX_BYTES = env.int('DOCUMENT_CACHE_MAX_BYTES', default=8 * 1024 * 1024)
+# Background document jobs: uploads wait here for the Celery worker (must be shared with it)
+DOCUMENT_JOB_UPLOAD_DIR = env('DOCUMENT_JOB_UPLOAD_DIR', default=os.path.join(BASE_DIR, 'document_jobs'))
+# Summarize uploads as background jobs unless the request sets async=false
+DOCUMENT_JOBS_ASYNC_DEFAULT = env.bool('DOCUMENT_JOBS_ASYNC_DEFAULT', default=False)
+# Running/queued jobs with no progress for this many seconds are failed and their upload removed
+DOCUMENT_JOB_STALE_AFTER = env.int('DOCUMENT_JOB_STALE_AFTER', default=60 * 60)
+# Times a job waits and retries while the user's 'document' rate limit is full
+DOCUMENT_JOB_RATE_LIMIT_RETRIES = env.int('DOCUMENT_JOB_RATE_LIMIT_RETRIES', default=20)
+# Server-sent event stream of job progress; each open stream holds a worker, so enable only on async servers
+DOCUMENT_JOB_SSE_ENABLED = env.bool('DOCUMENT_JOB_SSE_ENABLED', default=False)
+# SSE poll interval and maximum duration in seconds
+DOCUMENT_JOB_SSE_POLL_INTERVAL = env.float('DOCUMENT_JOB_SSE_POLL_INTERVAL', default=1.0)
+DOCUMENT_JOB_SSE_TIMEOUT = env.int('DOCUMENT_JOB_SSE_TIMEOUT', default=60)
+# Batch summaries: files at most per request, files processed at once, and LLM calls in flight across the batch
+DOCUMENT_BATCH_MAX_FILES = env.int('DOCUMENT_BATCH_MAX_FILES', default=20)
+DOCUMENT_BATCH_CONCURRENCY = env.int('DOCUMENT_BATCH_CONCURRENCY', default=4)
+DOCUMENT_BATCH_LLM_CONCURRENCY = env.int('DOCUMENT_BATCH_LLM_CONCURRENCY', default=6)
+
+# Per-user LLM rate/concurrency limits; plans override them via features['llm_rate_limit']
+LLM_RATE_LIMIT_ENABLED = env.bool('LLM_RATE_LIMIT_ENABLED', default=True)
+LLM_RATE_LIMIT_DEFAULTS = {
+    'per_minute': env.int('LLM_RATE_LIMIT_PER_MINUTE', default=20),
+    'burst': env.int('LLM_RATE_LIMIT_BURST', default=10),
+    'concurrency': env.int('LLM_RATE_LIMIT_CONCURRENCY', default=2),
+}
+# Seconds after which a concurrency slot of a crashed request is reclaimed
+LLM_RATE_LIMIT_HOLD_TIMEOUT = env.int('LLM_RATE_LIMIT_HOLD_TIMEOUT', default=300)
+
+# Per-call LLM instrumentation; per-user daily aggregates go to chatbot.LLMUsage
+LLM_USAGE_TRACKING_ENABLED = env.bool('LLM_USAGE_TRACKING_ENABLED', default=True)
+# USD per 1M tokens (input, output), used for cost estimates
+LLM_MODEL_PRICING = {
+    'gpt-4': (30.0, 60.0),
+    'gpt-4o': (2.5, 10.0),
+    'gpt-4o-mini': (0.15, 0.6),
+}
+
+# LLM backend: 'openai', or 'replay' for the offline stand-in used by benchmarks
+LLM_BACKEND = env('LLM_BACKEND', default='openai')
+LLM_REPLAY_FIXTURES = env('LLM_REPLAY_FIXTURES', default=None)
+LLM_REPLAY_LATENCY = {
+    'default': {'distribution': 'lognormal', 'median_ms': 800, 'sigma': 0.5},
+}
+
+
 CELERY_BEAT_SCHEDULE = {
     'reset-weekly-usage': {
         'task': 'subscription.tasks.reset_weekly_usage',
@@ -201,6 +325,14 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'actions.tasks.check_and_send_reminders',
         'schedule': 10.0,  
     },
+    'archive-old-chat-messages': {
+        'task': 'chatbot.tasks.archive_old_chat_messages',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'fail-stale-document-jobs': {
+        'task': 'chatbot.tasks.fail_stale_document_jobs',
+        'schedule': crontab(minute='*/10'),
+    },
 }
 
 